@@ -0,0 +1,216 @@
+import asyncio
+import hmac
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from prometheus_client import Counter
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import ADMIN_API_KEY, IMPORT_BATCH_SIZE, IMPORT_HASH_WORKERS
+from database import get_users, duplicate_user_field
+from decorator import UTCNow
+from hashing import HashingPool
+from models import ImportUserData
+from users import invalidate_user
+from common.ndjson import MAX_LINE_BYTES, read_lines
+from utils import hash_password
+
+admin_router = APIRouter(prefix="/admin")
+
+USERS_IMPORTED = Counter(
+    "envybase_users_imported_total",
+    "Users processed by bulk imports, by result (inserted or failed).",
+    ["result"],
+)
+
+# Errors listed in an import report, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# Separate from the login pool so an import never makes logins wait. One import
+# runs at a time, so a whole batch can be queued without being rejected.
+import_hashing_pool = HashingPool("process", IMPORT_HASH_WORKERS, IMPORT_BATCH_SIZE)
+_import_lock = asyncio.Lock()
+
+
+def require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """
+    Requires the X-Admin-Key header to match ADMIN_API_KEY.
+
+    Raises:
+        HTTPException: If the key is missing or wrong, or no key is configured. (Error code: 300x11)
+    """
+    if (
+        not ADMIN_API_KEY
+        or not x_admin_key
+        or not hmac.compare_digest(x_admin_key.encode(), ADMIN_API_KEY.encode())
+    ):
+        raise HTTPException(
+            status_code=403,
+            detail="Invalid admin key --ENVYSTART--ERROR:300x11--ENVYEND--",
+        )
+
+
+class ImportReport:
+    """
+    Outcome of a bulk import, row errors are referenced by line number.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lines = 0
+        self.inserted = 0
+        self.hashed = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line: int, message: str, code: str = "400"):
+        self.failed += 1
+        USERS_IMPORTED.labels("failed").inc()
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message, "code": code})
+
+    def as_dict(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "status": "success",
+            "lines": self.lines,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "hashed": self.hashed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errors_truncated": self.failed > len(self.errors),
+            "seconds": round(seconds, 3),
+            "users_per_second": round(self.inserted / seconds, 1) if seconds else 0,
+        }
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors()
+    )
+
+
+async def _prepare_batch(rows: list, report: ImportReport) -> list:
+    """
+    Builds the user documents of a batch, hashing plaintext passwords in parallel.
+    """
+    plaintext = [row for _, row in rows if row.password is not None]
+    hashes = await asyncio.gather(
+        *(import_hashing_pool.run(hash_password, row.password) for row in plaintext)
+    )
+    report.hashed += len(hashes)
+    hashes = iter(hashes)
+    now = UTCNow()
+    return [
+        {
+            "email": row.email,
+            "password": row.password_hash or next(hashes),
+            "name": row.name,
+            "username": row.username,
+            "created_at": row.created_at or now,
+        }
+        for _, row in rows
+    ]
+
+
+async def _insert_batch(line_numbers: list, users: list, report: ImportReport):
+    """
+    Inserts a batch unordered, so rows rejected by the unique indexes do not stop
+    the others, and records the rejected rows.
+    """
+    try:
+        await get_users().insert_many(users, ordered=False)
+        inserted = len(users)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        for error in write_errors:
+            line = line_numbers[error["index"]]
+            if error.get("code") == 11000:
+                if duplicate_user_field(error, error.get("errmsg", "")) == "username":
+                    report.error(line, "Username already registered", "300x7")
+                else:
+                    report.error(line, "Email already registered", "300x5")
+            else:
+                report.error(line, error.get("errmsg", "Write error"), "500")
+        inserted = e.details.get("nInserted", len(users) - len(write_errors))
+    except PyMongoError as e:
+        for line in line_numbers:
+            report.error(line, f"Database error: {str(e)}", "500")
+        return
+    finally:
+        for user in users:
+            invalidate_user(user["email"])
+    report.inserted += inserted
+    USERS_IMPORTED.labels("inserted").inc(inserted)
+
+
+@admin_router.post(
+    "/users/import",
+    summary="Bulk import users",
+    dependencies=[Depends(require_admin_key)],
+)
+async def import_users(request: Request):
+    """
+    Imports users from an NDJSON body, one JSON object per line with 'email', 'name',
+    'username', either 'password' (plaintext) or 'password_hash' (bcrypt, stored
+    as-is) and optionally 'created_at'.
+
+    The body is processed as it is uploaded, in batches of IMPORT_BATCH_SIZE users:
+    plaintext passwords are hashed on a process pool and each batch is written with
+    one unordered insert, while the next batch is being hashed. Rows that are invalid
+    or collide with an existing email or username are skipped and reported.
+
+    Raises:
+        HTTPException: If the admin key is missing or wrong. (Error code: 300x11)
+        HTTPException: If another import is running. (Error code: 300x12)
+
+    Returns:
+        A report with counts, row errors (line number, message and error code) and
+        the import throughput.
+    """
+    if _import_lock.locked():
+        raise HTTPException(
+            status_code=409,
+            detail="An import is already running --ENVYSTART--ERROR:300x12--ENVYEND--",
+        )
+    async with _import_lock:
+        report = ImportReport()
+        rows = []
+        inserting: Optional[asyncio.Task] = None
+
+        async def flush():
+            nonlocal inserting
+            users = await _prepare_batch(rows, report)
+            if inserting is not None:
+                await inserting
+            inserting = asyncio.create_task(
+                _insert_batch([line for line, _ in rows], users, report)
+            )
+
+        try:
+            async for line in read_lines(request):
+                report.lines += 1
+                if line is None:
+                    report.error(
+                        report.lines, f"Line longer than {MAX_LINE_BYTES} bytes"
+                    )
+                    continue
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(
+                        (report.lines, ImportUserData.model_validate_json(line))
+                    )
+                except ValidationError as e:
+                    report.error(report.lines, _validation_message(e))
+                    continue
+                if len(rows) >= IMPORT_BATCH_SIZE:
+                    await flush()
+                    rows = []
+            if rows:
+                await flush()
+        finally:
+            # Batches already hashed are written even if the upload broke off
+            if inserting is not None:
+                await inserting
+        return report.as_dict()
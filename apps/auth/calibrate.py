@@ -0,0 +1,113 @@
+"""
+Measures password hashing time on this machine and recommends hash parameters.
+
+Picks the most expensive parameters whose median hash time stays within the target
+latency, and prints them as environment variables for the auth service. Run it on
+the hardware (or in the container) the service runs on:
+
+    python calibrate.py --target-ms 250 [--scheme bcrypt|argon2]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import bcrypt
+from argon2 import PasswordHasher
+
+PASSWORD = "calibration password"
+
+
+def median_ms(hash_once, samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hash_once()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(target_ms: float, samples: int):
+    best = None
+    for rounds in range(4, 32):
+        elapsed = median_ms(
+            lambda rounds=rounds: bcrypt.hashpw(
+                PASSWORD.encode(), bcrypt.gensalt(rounds)
+            ),
+            samples,
+        )
+        print(f"  BCRYPT_ROUNDS={rounds:<3} {elapsed:9.1f} ms")
+        if elapsed > target_ms:
+            break
+        best = (rounds, elapsed)
+    if best is None:
+        return None
+    return {"PASSWORD_HASH_SCHEME": "bcrypt", "BCRYPT_ROUNDS": best[0]}, best[1]
+
+
+def calibrate_argon2(target_ms: float, samples: int, memory_kib: int, lanes: int):
+    best = None
+    for time_cost in range(1, 33):
+        hasher = PasswordHasher(
+            time_cost=time_cost, memory_cost=memory_kib, parallelism=lanes
+        )
+        elapsed = median_ms(lambda hasher=hasher: hasher.hash(PASSWORD), samples)
+        print(f"  ARGON2_TIME_COST={time_cost:<3} {elapsed:9.1f} ms")
+        if elapsed > target_ms:
+            break
+        best = (time_cost, elapsed)
+    if best is None:
+        return None
+    return {
+        "PASSWORD_HASH_SCHEME": "argon2",
+        "ARGON2_TIME_COST": best[0],
+        "ARGON2_MEMORY_COST": memory_kib,
+        "ARGON2_PARALLELISM": lanes,
+    }, best[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=250,
+        help="Hash time budget of a single login, in milliseconds",
+    )
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument(
+        "--memory-kib", type=int, default=65536, help="argon2 memory per hash"
+    )
+    parser.add_argument("--parallelism", type=int, default=4, help="argon2 lanes")
+    args = parser.parse_args()
+
+    print(f"Calibrating {args.scheme} for {args.target_ms:g} ms per hash")
+    if args.scheme == "argon2":
+        result = calibrate_argon2(
+            args.target_ms, args.samples, args.memory_kib, args.parallelism
+        )
+    else:
+        result = calibrate_bcrypt(args.target_ms, args.samples)
+    if result is None:
+        print("Even the cheapest parameters exceed the target, raise --target-ms")
+        if args.scheme == "argon2":
+            print("or lower --memory-kib")
+        raise SystemExit(1)
+
+    params, elapsed = result
+    cores = os.cpu_count() or 1
+    print()
+    print("Recommended settings:")
+    for name, value in params.items():
+        print(f"{name}={value}")
+    print()
+    print(
+        f"Each login then spends about {elapsed:.0f} ms hashing, so this machine "
+        f"handles roughly {cores * 1000 / elapsed:.0f} logins/s with HASH_WORKERS={cores}."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from common.server import per_worker
 
 load_dotenv()
 
@@ -103,11 +104,87 @@ if "github" in SOCIAL_LOGINS:
     GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
 
 
-ISCLOUDFLARE = os.getenv("ISCLOUDFLARE", False)
+ISCLOUDFLARE = os.getenv("ISCLOUDFLARE", "False") == "True"
 if not os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"):
     print(
         "\033[33m[WARN]\033[0m ACCESS_TOKEN_EXPIRE_MINUTES not set, using default value of 60"
     )
 
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
-DOCKER = os.getenv("DOCKER", False)
+DOCKER = os.getenv("DOCKER", "False") == "True"
+
+# Request log buffering (see common/logbuffer.py)
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", 10000))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 500))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 1.0))
+# Seconds to wait for room when the buffer is full, 0 drops the log instead
+LOG_BLOCK_TIMEOUT = float(os.getenv("LOG_BLOCK_TIMEOUT", 0))
+# Days before log entries expire, 0 keeps them forever
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", 30))
+
+# MongoDB connections of a service instance, split between its server processes
+MONGO_POOL_SIZE = per_worker(int(os.getenv("MONGO_POOL_SIZE", 50)), minimum=5)
+
+# Password hashing pool, bcrypt runs off the event loop
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+if HASH_EXECUTOR not in ("thread", "process"):
+    raise ValueError(
+        format_error_message("HASH_EXECUTOR must be either 'thread' or 'process'")
+    )
+# Defaults to the CPU cores, shared between the server processes
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", per_worker(os.cpu_count() or 1)))
+# Hash jobs allowed to wait for a worker before requests are rejected with a 503
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", HASH_WORKERS * 4))
+
+# Password hashing parameters, run calibrate.py to pick them for this hardware.
+# Stored hashes using other parameters are upgraded on the next successful login.
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+if PASSWORD_HASH_SCHEME not in ("bcrypt", "argon2"):
+    raise ValueError(
+        format_error_message("PASSWORD_HASH_SCHEME must be either 'bcrypt' or 'argon2'")
+    )
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+if not 4 <= BCRYPT_ROUNDS <= 31:
+    raise ValueError(format_error_message("BCRYPT_ROUNDS must be between 4 and 31"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+# Memory per hash in KiB
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+
+# In-process cache of user lookups by email, per worker. A password change made
+# by another worker is seen after at most USER_CACHE_TTL seconds, 0 disables it.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+
+# Verified access tokens cached by /verify, each until the token expires
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", 10000))
+
+# Access token signing. HS256 signs with AUTH_KEY. RS256 and EdDSA sign with the
+# private keys in JWT_KEYS_DIR (one <kid>.pem each, see keys.py) and publish the
+# public keys at /.well-known/jwks.json so other services verify tokens locally.
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+if JWT_ALGORITHM not in ("HS256", "RS256", "EdDSA"):
+    raise ValueError(
+        format_error_message("JWT_ALGORITHM must be one of HS256, RS256 or EdDSA")
+    )
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")
+# Key ID to sign with, defaults to the newest key (the last <kid>.pem by name)
+# older than JWT_KEY_ACTIVATION_DELAY seconds
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")
+# Time for verifiers to pick up a new key from the JWKS before it signs tokens,
+# at least the JWKS cache lifetime of the verifiers plus a minute
+JWT_KEY_ACTIVATION_DELAY = float(os.getenv("JWT_KEY_ACTIVATION_DELAY", 600))
+
+# Login throttling in Redis, shared by every worker and replica. Attempts are
+# counted per client IP and per email over a sliding window, 0 disables a limit.
+LOGIN_RATE_WINDOW = int(os.getenv("LOGIN_RATE_WINDOW", 60))
+LOGIN_RATE_LIMIT_IP = int(os.getenv("LOGIN_RATE_LIMIT_IP", 30))
+LOGIN_RATE_LIMIT_EMAIL = int(os.getenv("LOGIN_RATE_LIMIT_EMAIL", 10))
+
+# Admin API (bulk user import), disabled unless a key is set. Clients send it in
+# the X-Admin-Key header.
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+# Users hashed and inserted together by the bulk import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+# Processes hashing plaintext passwords during imports, apart from the login pool
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", os.cpu_count() or 1))
@@ -1,6 +1,17 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConnectionFailure
-from config import MONGO_URI
+from pymongo.errors import ConnectionFailure, OperationFailure
+from config import (
+    MONGO_URI,
+    MONGO_POOL_SIZE,
+    LOG_BUFFER_SIZE,
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL,
+    LOG_BLOCK_TIMEOUT,
+    LOG_RETENTION_DAYS,
+)
+from common.logbuffer import LogBuffer
+from common.logcollection import ensure_logs_collection
+from common.metrics import PoolMetricsListener
 
 
 # Globals to hold the database connection and collections
@@ -10,6 +21,9 @@ _db = None
 _users = None
 _logs = None
 
+# Fields that identify a user, each backed by a unique index
+USER_UNIQUE_FIELDS = ("email", "username")
+
 
 async def init_db():
     """
@@ -20,10 +34,11 @@ async def init_db():
     try:
         client = AsyncIOMotorClient(
             MONGO_URI,
-            maxPoolSize=50,
+            maxPoolSize=MONGO_POOL_SIZE,
             connectTimeoutMS=5000,
             serverSelectionTimeoutMS=5000,
             waitQueueTimeoutMS=5000,
+            event_listeners=[PoolMetricsListener("auth")],
         )
 
         await client.admin.command("ping")
@@ -31,6 +46,8 @@ async def init_db():
         _db = client[DB_NAME]
         _users = _db["users"]
         _logs = _db["logs"]
+        await ensure_logs_collection(_db, LOG_RETENTION_DAYS * 86400)
+        await ensure_user_indexes(_users)
         print("MongoDB connection established successfully.")
         return True
     except ConnectionFailure as e:
@@ -39,6 +56,42 @@ async def init_db():
         ) from e
 
 
+async def ensure_user_indexes(users):
+    """
+    Ensures the unique indexes on 'email' and 'username' of the users collection.
+
+    Registration relies on them to reject duplicates in a single insert.
+
+    Raises:
+        Exception: If an index cannot be built, e.g. because duplicates already exist.
+    """
+    for field in USER_UNIQUE_FIELDS:
+        try:
+            await users.create_index(field, unique=True, name=f"{field}_unique")
+        except OperationFailure as e:
+            raise Exception(
+                f"Failed to create the unique index on users.{field}: {str(e)}. "
+                f"Please remove duplicate {field} values from the users collection."
+            ) from e
+
+
+def duplicate_user_field(details: dict, message: str) -> str:
+    """
+    Tells which unique field of a user a duplicate key error is about.
+
+    Args:
+        details: The error document, with 'keyPattern' when the server sends it.
+        message: The error message, naming the index otherwise.
+
+    Returns:
+        'username' or 'email'.
+    """
+    key_pattern = (details or {}).get("keyPattern") or {}
+    if "username" in key_pattern or "username_unique" in message:
+        return "username"
+    return "email"
+
+
 def get_db():
     global _db
     if _db is None:
@@ -66,6 +119,17 @@ def get_logs():
     return _logs
 
 
+# Request logs are batched in memory and written with insert_many,
+# started and drained by the application lifespan
+log_buffer = LogBuffer(
+    get_logs,
+    max_size=LOG_BUFFER_SIZE,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+    block_timeout=LOG_BLOCK_TIMEOUT,
+)
+
+
 async def close_db_connection():
     """
     Closes the MongoDB client connection if it exists.
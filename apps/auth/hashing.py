@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+from config import HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_SIZE
+from database import get_users
+from users import invalidate_user
+from utils import hash_password, verify_password, password_needs_rehash
+
+logger = logging.getLogger("hashing")
+
+HASH_JOBS = Gauge(
+    "envybase_password_hash_jobs",
+    "Password hash jobs running or waiting for a worker.",
+    multiprocess_mode="livesum",
+)
+HASH_REJECTED = Counter(
+    "envybase_password_hash_rejected_total",
+    "Password hash jobs rejected because the hashing pool was saturated.",
+)
+PASSWORDS_REHASHED = Counter(
+    "envybase_password_rehashed_total",
+    "Stored password hashes upgraded to the configured scheme and cost on login.",
+)
+
+
+class HashingPool:
+    """
+    Bounded executor for CPU-bound password hashing.
+
+    bcrypt takes tens to hundreds of milliseconds per call, so it runs on a thread or
+    process pool instead of the event loop. At most ``workers + queue_size`` jobs are
+    accepted at once; beyond that, callers are rejected immediately so that a login
+    storm sheds load instead of queueing without bound.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = 1, queue_size: int = 0):
+        """
+        Args:
+            kind: 'thread' or 'process'. bcrypt releases the GIL, so threads scale
+                across cores; processes isolate the hashing from the server process.
+            workers: Number of hashing workers.
+            queue_size: Jobs allowed to wait for a free worker.
+        """
+        self.kind = kind
+        self.workers = workers
+        self.limit = workers + queue_size
+        self.pending = 0
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # Forking would copy the Motor and pymongo threads' locks in
+                # whatever state they are, the workers start from a clean process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="hashing"
+                )
+        return self._executor
+
+    async def run(self, func, *args):
+        """
+        Runs ``func(*args)`` on the pool.
+
+        Raises:
+            HTTPException: If the pool is saturated. (Error code: 300x8)
+        """
+        if self.pending >= self.limit:
+            HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry --ENVYSTART--ERROR:300x8--ENVYEND--",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        HASH_JOBS.inc()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            HASH_JOBS.dec()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+hashing_pool = HashingPool(HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_SIZE)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password using bcrypt on the hashing pool"""
+    return await hashing_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash on the hashing pool"""
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def rehash_password_if_needed(user: dict, password: str):
+    """
+    Replaces the stored hash of a user who just logged in with ``password`` when it
+    was made with outdated parameters.
+
+    Best effort: if the hashing pool is saturated the upgrade is skipped and retried
+    on a later login. The update is conditional on the old hash, so a password
+    change racing with the login is never overwritten.
+    """
+    if not password_needs_rehash(user["password"]):
+        return
+    try:
+        new_hash = await hash_password_async(password)
+    except HTTPException:
+        return
+    result = await get_users().update_one(
+        {"_id": user["_id"], "password": user["password"]},
+        {"$set": {"password": new_hash}},
+    )
+    invalidate_user(user["email"])
+    if result.modified_count:
+        PASSWORDS_REHASHED.inc()
+        logger.info("Upgraded the password hash of user %s", user["_id"])
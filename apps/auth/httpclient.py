@@ -0,0 +1,48 @@
+from typing import Optional
+
+import httpx
+
+# Calls to OAuth2 providers: fail fast on connect, allow slow token exchanges
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=60
+)
+
+_pool: Optional[httpx.AsyncHTTPTransport] = None
+
+
+def _get_pool() -> httpx.AsyncHTTPTransport:
+    global _pool
+    if _pool is None:
+        _pool = httpx.AsyncHTTPTransport(http2=True, limits=HTTP_LIMITS, retries=1)
+    return _pool
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """
+    Transport handing requests to the process-wide keep-alive connection pool.
+
+    Closing it leaves the pool open, so clients that are created and closed per
+    call (like Authlib's) still reuse connections; the pool itself is closed by
+    ``close_http_pool`` on shutdown.
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await _get_pool().handle_async_request(request)
+
+    async def aclose(self):
+        pass
+
+
+# Shared client for outgoing HTTP calls, e.g. provider user info and JWKS
+http_client = httpx.AsyncClient(transport=PooledTransport(), timeout=HTTP_TIMEOUT)
+
+
+async def close_http_pool():
+    """
+    Closes the pooled connections, called by the application lifespan on shutdown.
+    """
+    global _pool
+    if _pool is not None:
+        await _pool.aclose()
+        _pool = None
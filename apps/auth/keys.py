@@ -0,0 +1,198 @@
+"""
+Signing keys for RS256/EdDSA access tokens.
+
+Every ``<kid>.pem`` file in JWT_KEYS_DIR holds one private key, its file name being
+the key ID. Tokens are signed with the active key and every key is published in the
+JWKS, so tokens signed with a retired key stay valid until they expire.
+
+To rotate, generate a new key. It is published right away but only signs tokens
+once JWT_KEY_ACTIVATION_DELAY has passed, by when every verifier has refetched the
+JWKS and knows it. Delete the old key file once ACCESS_TOKEN_EXPIRE_MINUTES more
+have passed:
+
+    python keys.py generate [--algorithm RS256|EdDSA]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from config import (
+    JWT_ALGORITHM,
+    JWT_KEYS_DIR,
+    JWT_ACTIVE_KID,
+    JWT_KEY_ACTIVATION_DELAY,
+)
+
+logger = logging.getLogger("keys")
+
+KEY_TYPES = {"RS256": rsa.RSAPrivateKey, "EdDSA": ed25519.Ed25519PrivateKey}
+# Seconds between checks of the key directory for added or removed keys
+RELOAD_INTERVAL = 60
+
+
+class SigningKeys:
+    """
+    The private keys of a key directory and their public JWKS.
+
+    Keys are loaded on first use and reloaded when the directory changes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        algorithm: str,
+        active_kid: Optional[str] = None,
+        activation_delay: float = 0,
+    ):
+        self.directory = directory
+        self.algorithm = algorithm
+        self.pinned_kid = active_kid
+        self.activation_delay = activation_delay
+        self._loaded = False
+        self._created: dict = {}
+        self._private: dict = {}
+        self._public: dict = {}
+        self._jwks = b""
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def load(self):
+        """
+        Loads every key of the directory.
+
+        Raises:
+            ValueError: If there is no usable key, or a key does not match the algorithm.
+        """
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith(".pem"))
+        except FileNotFoundError:
+            mtime, names = None, []
+        created, private, public, jwks = {}, {}, {}, []
+        for name in names:
+            kid = name[: -len(".pem")]
+            path = os.path.join(self.directory, name)
+            with open(path, "rb") as f:
+                key = serialization.load_pem_private_key(f.read(), password=None)
+            created[kid] = os.stat(path).st_mtime
+            if not isinstance(key, KEY_TYPES[self.algorithm]):
+                raise ValueError(f"Key '{kid}' cannot be used with {self.algorithm}")
+            private[kid] = key
+            public[kid] = key.public_key()
+            if self.algorithm == "RS256":
+                jwk = RSAAlgorithm.to_jwk(public[kid], as_dict=True)
+            else:
+                jwk = OKPAlgorithm.to_jwk(public[kid], as_dict=True)
+            jwk.update({"kid": kid, "use": "sig", "alg": self.algorithm})
+            jwks.append(jwk)
+        if not private or (self.pinned_kid and self.pinned_kid not in private):
+            raise ValueError(
+                f"No signing key '{self.pinned_kid or '*'}.pem' in {self.directory}, "
+                "create one with 'python keys.py generate'"
+            )
+        self._created, self._private, self._public = created, private, public
+        self._loaded = True
+        self._jwks = json.dumps({"keys": jwks}).encode()
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if not self._loaded:
+            self.load()
+        elif now - self._checked_at >= RELOAD_INTERVAL:
+            self._checked_at = now
+            try:
+                changed = os.stat(self.directory).st_mtime_ns != self._mtime
+            except FileNotFoundError:
+                changed = False  # Keep signing with the keys already loaded
+            if changed:
+                try:
+                    self.load()
+                except (ValueError, TypeError, OSError) as e:
+                    logger.error("Keeping the loaded signing keys: %s", e)
+
+    def active(self):
+        """
+        Returns the (kid, private key) pair to sign new tokens with: the pinned key,
+        else the newest key published for at least the activation delay, else the
+        oldest key.
+        """
+        self._refresh()
+        kid = self.pinned_kid
+        if kid is None:
+            kids = sorted(self._private)
+            mature = time.time() - self.activation_delay
+            kid = next(
+                (k for k in reversed(kids) if self._created[k] <= mature), kids[0]
+            )
+        return kid, self._private[kid]
+
+    def public_key(self, kid: str):
+        """Returns the public key with this ID, or None if it is unknown."""
+        if kid not in self._public:
+            # Possibly just added by another worker, check the directory right away
+            self._checked_at = 0.0
+        self._refresh()
+        return self._public.get(kid)
+
+    def jwks(self) -> bytes:
+        """Returns the JSON Web Key Set of all public keys, serialized."""
+        self._refresh()
+        return self._jwks
+
+
+signing_keys = (
+    SigningKeys(JWT_KEYS_DIR, JWT_ALGORITHM, JWT_ACTIVE_KID, JWT_KEY_ACTIVATION_DELAY)
+    if JWT_ALGORITHM != "HS256"
+    else None
+)
+
+
+def generate_key(directory: str, algorithm: str) -> str:
+    """
+    Writes a new private key to the key directory.
+
+    Returns:
+        The key ID, the current UTC time so that newer keys sort last.
+    """
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ed25519.Ed25519PrivateKey.generate()
+    kid = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    path = os.path.join(directory, f"{kid}.pem")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return kid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage access token signing keys")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="Create a new signing key")
+    generate.add_argument(
+        "--algorithm",
+        choices=sorted(KEY_TYPES),
+        default=JWT_ALGORITHM if JWT_ALGORITHM in KEY_TYPES else "RS256",
+    )
+    args = parser.parse_args()
+    kid = generate_key(JWT_KEYS_DIR, args.algorithm)
+    print(f"Created {args.algorithm} key '{kid}' in {JWT_KEYS_DIR}")
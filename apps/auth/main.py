@@ -1,23 +1,47 @@
-from fastapi import FastAPI, HTTPException, Response, Request
-import uvicorn
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Response, Request
 import models
-from decorator import UTCNow
+from decorator import UTCNow, real_ip, service
 from config import (
     PASSWORD_MAX_LENGTH,
+    ISCLOUDFLARE,
     PASSWORD_MIN_LENGTH,
     AUTH_PORT,
     ISSECURE,
     AUTH_KEY,
     DOCKER,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
 )
 
-from database import get_users, init_db, close_db_connection
-from utils import hash_password, verify_password, create_jwt_token
-from decorator import loggers_route
-from oauth2 import oauth2_router
+from database import (
+    get_users,
+    init_db,
+    close_db_connection,
+    log_buffer,
+    duplicate_user_field,
+)
+from users import find_user_by_email, invalidate_user
+from utils import create_jwt_token
+from hashing import (
+    hash_password_async,
+    verify_password_async,
+    rehash_password_if_needed,
+    hashing_pool,
+)
+from oauth2 import oauth2_router, close_oidc_providers
+from httpclient import close_http_pool
+from ratelimit import check_login_rate, close_redis
 from stats import stats_router
+from verify import verify_router
+from admin import admin_router, import_hashing_pool
+from keys import signing_keys
 from starlette.middleware.sessions import SessionMiddleware
+from common.middleware import RequestLogMiddleware
+from common.metrics import EventLoopMonitor, metrics_response
+from common.server import serve
 from contextlib import asynccontextmanager
+from pymongo.errors import DuplicateKeyError
+
+loop_monitor = EventLoopMonitor("auth")
 
 
 @asynccontextmanager
@@ -26,9 +50,14 @@ async def lifespan(app: FastAPI):
     Manages the application's startup and shutdown events for database connection.
 
     Initializes the database connection when the application starts and ensures it is properly closed on shutdown.
+    Buffered request logs are flushed before the connection is closed.
     """
     try:
+        if signing_keys is not None:
+            signing_keys.load()  # Fail at startup rather than on the first login
         await init_db()
+        log_buffer.start()
+        loop_monitor.start()
         yield
     except Exception as e:
         import sys
@@ -37,7 +66,14 @@ async def lifespan(app: FastAPI):
         # Do not yield here: let the exception propagate so FastAPI/Uvicorn exits with error
         raise
     finally:
+        await loop_monitor.stop()
+        await log_buffer.stop()
         await close_db_connection()
+        await close_oidc_providers()
+        await close_http_pool()
+        await close_redis()
+        hashing_pool.shutdown()
+        import_hashing_pool.shutdown()
 
 
 app = FastAPI(
@@ -48,20 +84,37 @@ app = FastAPI(
 )
 
 app.add_middleware(SessionMiddleware, secret_key=AUTH_KEY)
+# Added last so it is the outermost middleware and times the whole request
+app.add_middleware(
+    RequestLogMiddleware,
+    service=service,
+    log_buffer=log_buffer,
+    trust_cloudflare=ISCLOUDFLARE,
+    # /verify runs for every request nginx proxies to the other services
+    exclude_paths=("/metrics", "/verify"),
+)
 
-# Include the routes from oauth2.py and stats.py
+# Include the routes from oauth2.py, stats.py, verify.py and admin.py
 app.include_router(oauth2_router, tags=["OAuth2"])
 app.include_router(stats_router, tags=["Statistics"])
+app.include_router(verify_router, tags=["Verification"])
+app.include_router(admin_router, tags=["Admin"])
 
 
 @app.get("/", summary="Health check")
-@loggers_route()
 async def read_root(request: Request, response: Response):
     return {"status": "healthy", "service": "auth"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Exposes the service metrics in the Prometheus text format.
+    """
+    return metrics_response()
+
+
 @app.get("/frontendinfo", summary="Get frontend info")
-@loggers_route()
 async def frontendinfo(request: Request, response: Response):
     return {
         "PASSWORD_MIN_LENGTH": PASSWORD_MIN_LENGTH,
@@ -70,23 +123,40 @@ async def frontendinfo(request: Request, response: Response):
 
 
 @app.post("/login")
-@loggers_route()
-async def login(request: Request, response: Response, data: models.LoginData):
+async def login(
+    request: Request,
+    response: Response,
+    data: models.LoginData,
+    background_tasks: BackgroundTasks,
+):
     """
     Authenticates a user by verifying email and password, and sets a JWT token cookie on success.
 
+    A stored password hash made with an outdated scheme or cost is upgraded on success,
+    after the response is sent.
+    Attempts are throttled per client IP and per email before any lookup or hashing.
+
     Raises:
         HTTPException: If the email or password is incorrect. (Error code: 300x6)
+        HTTPException: If the password hashing pool is saturated. (Error code: 300x8)
+        HTTPException: If there were too many recent login attempts. (Error code: 300x10)
 
     Returns:
         A JSON object indicating successful login and the user's email.
     """
-    user = await get_users().find_one({"email": data.email})
-    if not user or not verify_password(data.password, user["password"]):
+    await check_login_rate(real_ip(request), data.email)
+    user = await find_user_by_email(data.email)
+    # OAuth2 users have no password to log in with
+    if (
+        not user
+        or not user.get("password")
+        or not await verify_password_async(data.password, user["password"])
+    ):
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password --ENVYSTART--ERROR:300x6--ENVYEND--",
         )
+    background_tasks.add_task(rehash_password_if_needed, user, data.password)
 
     token = create_jwt_token({"sub": user["email"]})
 
@@ -96,33 +166,24 @@ async def login(request: Request, response: Response, data: models.LoginData):
         httponly=True,
         secure=ISSECURE,
         samesite="lax",
+        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
     )
     return {"status": "success", "email": user["email"]}
 
 
 @app.post("/register")
-@loggers_route()
 async def register(request: Request, response: Response, data: models.RegisterData):
     """
     Registers a new user with the provided email, password, name, and username.
 
     Raises:
         HTTPException: If the email or username is already registered. (Error code: 300x5, 300x7)
+        HTTPException: If the password hashing pool is saturated. (Error code: 300x8)
 
     Returns:
         A JSON object indicating successful registration and the user's email.
     """
-    if await get_users().find_one({"email": data.email}):
-        raise HTTPException(
-            status_code=400,
-            detail="Email already registered --ENVYSTART--ERROR:300x5--ENVYEND--",
-        )
-    if await get_users().find_one({"username": data.username}):
-        raise HTTPException(
-            status_code=400,
-            detail="Username already registered --ENVYSTART--ERROR:300x7--ENVYEND--",
-        )
-    hashed_password = hash_password(data.password)
+    hashed_password = await hash_password_async(data.password)
     user_data = {
         "email": data.email,
         "password": hashed_password,
@@ -131,15 +192,23 @@ async def register(request: Request, response: Response, data: models.RegisterDa
         "created_at": UTCNow(),
     }
 
-    await get_users().insert_one(user_data)
+    # The unique indexes reject duplicates, no lookups needed beforehand
+    try:
+        await get_users().insert_one(user_data)
+    except DuplicateKeyError as e:
+        if duplicate_user_field(e.details, str(e)) == "username":
+            raise HTTPException(
+                status_code=400,
+                detail="Username already registered --ENVYSTART--ERROR:300x7--ENVYEND--",
+            )
+        raise HTTPException(
+            status_code=400,
+            detail="Email already registered --ENVYSTART--ERROR:300x5--ENVYEND--",
+        )
+    finally:
+        invalidate_user(data.email)
     return {"status": "success", "email": data.email}
 
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=AUTH_PORT,
-        reload=not DOCKER,
-        factory=False,
-    )
+    serve("main:app", "0.0.0.0", AUTH_PORT, reload=not DOCKER)
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, model_validator
 from config import (
     PASSWORD_MAX_LENGTH,
     PASSWORD_MIN_LENGTH,
@@ -40,3 +42,39 @@ class RegisterData(BaseModel):
         max_length=USERNAME_MAX_LENGTH,
         description=f"Username of the user, must be {USERNAME_MIN_LENGTH}-{USERNAME_MAX_LENGTH} characters",
     )
+
+
+class ImportUserData(BaseModel):
+    """
+    Data model for one user of a bulk import, given either a plaintext password or
+    an existing bcrypt hash.
+    """
+
+    email: EmailStr = Field(..., description="Email address of the user")
+    password: Optional[str] = Field(
+        None,
+        min_length=PASSWORD_MIN_LENGTH,
+        max_length=PASSWORD_MAX_LENGTH,
+        description="Plaintext password, hashed during the import",
+    )
+    password_hash: Optional[str] = Field(
+        None,
+        pattern=r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$",
+        description="bcrypt hash of the password, stored as-is",
+    )
+    name: str = Field(..., max_length=100, description="Name of the user")
+    username: str = Field(
+        ...,
+        min_length=USERNAME_MIN_LENGTH,
+        max_length=USERNAME_MAX_LENGTH,
+        description=f"Username of the user, must be {USERNAME_MIN_LENGTH}-{USERNAME_MAX_LENGTH} characters",
+    )
+    created_at: Optional[datetime] = Field(
+        None, description="Original registration time, defaults to the import time"
+    )
+
+    @model_validator(mode="after")
+    def check_password(self):
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("Exactly one of password or password_hash is required")
+        return self
@@ -2,14 +2,16 @@ from authlib.integrations.starlette_client import OAuth, OAuthError
 from fastapi import APIRouter, HTTPException, Request
 import config
 import configparser
-import jwt
-from jwt import PyJWKClient
-from database import get_users, get_logs
+from database import get_users, log_buffer
+from users import find_user_by_email, invalidate_user
+from pymongo.errors import DuplicateKeyError
+from common.logcollection import log_entry
+from oidc import OIDCProvider
+from httpclient import http_client, PooledTransport, HTTP_TIMEOUT
 from utils import create_jwt_token, generate_username
 import datetime
 import pytz
 import random
-import httpx
 
 ini = configparser.ConfigParser()
 
@@ -65,7 +67,12 @@ for name, params in providers.items():
         "authorize_url": params["authorize_url"],
         "access_token_url": params["access_token_url"],
         "userinfo_endpoint": params["userinfo_endpoint"],
-        "client_kwargs": params.get("client_kwargs", {}),
+        # Authlib's per-call clients share the pooled connections too
+        "client_kwargs": {
+            **params.get("client_kwargs", {}),
+            "transport": PooledTransport(),
+            "timeout": HTTP_TIMEOUT,
+        },
     }
     if name == "github":
         opts["access_token_params"] = params["access_token_params"]
@@ -73,6 +80,20 @@ for name, params in providers.items():
         opts["server_metadata_url"] = params["server_metadata_url"]
     oauth.register(**opts)
 
+# Discovery documents and id_token keys of the OpenID Connect providers
+oidc_providers = {
+    name: OIDCProvider(
+        params["server_metadata_url"], params["client_id"], http_client=http_client
+    )
+    for name, params in providers.items()
+    if "server_metadata_url" in params
+}
+
+
+async def close_oidc_providers():
+    for oidc_provider in oidc_providers.values():
+        await oidc_provider.close()
+
 
 async def log_and_raise(
     exc: Exception,
@@ -81,17 +102,17 @@ async def log_and_raise(
     error_id: int | None = None,
     http_status: int = 400,
 ):
-    await get_logs().insert_one(
-        {
-            "error": str(exc),
-            "timestamp": utc_now(),
-            "service": "error",
-            "status": "error",
-            "error_id": error_id,
-            "envy_error": envy_code,
-            "type": error_type,
-            "status_code": http_status,
-        }
+    await log_buffer.put(
+        log_entry(
+            "auth",
+            "/oauth2",
+            error=str(exc),
+            status="error",
+            error_id=error_id,
+            envy_error=envy_code,
+            type=error_type,
+            status_code=http_status,
+        )
     )
     if error_id:
         raise HTTPException(
@@ -111,52 +132,44 @@ async def fetch_user_info(client, token, provider: str, error_id: int) -> dict:
             access_token = token.get("access_token")
             if not access_token:
                 raise ValueError("No access_token in GitHub response")
-            async with httpx.AsyncClient() as c:
-                headers = {"Authorization": f"Bearer {access_token}"}
-                # Fetch the main profile
-                user_resp = await c.get(
-                    providers["github"]["userinfo_endpoint"], headers=headers
-                )
-                data = user_resp.json()
-                # Email fallback
-                if not data.get("email"):
-                    emails_resp = await c.get(
-                        providers["github"]["email_endpoint"], headers=headers
-                    )
-                    primary = next(
-                        (
-                            e["email"]
-                            for e in emails_resp.json()
-                            if e.get("primary") and e.get("verified")
-                        ),
-                        None,
-                    )
-                    data["email"] = primary
-                # Map GitHub fields
-                data["given_name"] = (
-                    data.get("name", "").split(" ")[0] if data.get("name") else ""
+            headers = {"Authorization": f"Bearer {access_token}"}
+            user_resp = await http_client.get(
+                providers["github"]["userinfo_endpoint"], headers=headers
+            )
+            user_resp.raise_for_status()
+            data = user_resp.json()
+            # Email fallback, only requested when the profile hides the email so
+            # that most logins cost a single call against the GitHub rate limit
+            if not data.get("email"):
+                emails_resp = await http_client.get(
+                    providers["github"]["email_endpoint"], headers=headers
                 )
-                data["family_name"] = (
-                    " ".join(data.get("name", "").split(" ")[1:])
-                    if data.get("name")
-                    else ""
+                emails_resp.raise_for_status()
+                primary = next(
+                    (
+                        e["email"]
+                        for e in emails_resp.json()
+                        if e.get("primary") and e.get("verified")
+                    ),
+                    None,
                 )
-                data["picture"] = data.get("avatar_url")
+                data["email"] = primary
+            # Map GitHub fields
+            data["given_name"] = (
+                data.get("name", "").split(" ")[0] if data.get("name") else ""
+            )
+            data["family_name"] = (
+                " ".join(data.get("name", "").split(" ")[1:])
+                if data.get("name")
+                else ""
+            )
+            data["picture"] = data.get("avatar_url")
             return data
-        # Google: manual JWK decode
+        # Google: id_token verified against the cached provider keys
         id_token = token.get("id_token")
         if not id_token:
             raise ValueError("No id_token in Google response")
-        metadata = await client.load_server_metadata()
-        jwks_uri = metadata.get("jwks_uri")
-        jwk_client = PyJWKClient(jwks_uri)
-        signing_key = jwk_client.get_signing_key_from_jwt(id_token)
-        return jwt.decode(
-            id_token,
-            signing_key.key,
-            algorithms=["RS256"],
-            audience=client.client_id,
-        )
+        return await oidc_providers[provider].verify_id_token(id_token)
     except Exception as e:
         await log_and_raise(e, "UserinfoFetchError", "300x3", error_id)
 
@@ -192,7 +205,7 @@ async def oauth2_callback(request: Request, provider: str):
         )
 
     # User lookup and provider check
-    user = await get_users().find_one({"email": email})
+    user = await find_user_by_email(email)
     if user:
         # Prevent login if provider differs
         if user.get("provider") != provider:
@@ -221,7 +234,13 @@ async def oauth2_callback(request: Request, provider: str):
         "created_at": utc_now(),
     }
     if is_new:
-        await get_users().insert_one(record)
+        try:
+            await get_users().insert_one(record)
+        except DuplicateKeyError as e:
+            # The same email registered concurrently
+            await log_and_raise(e, "DuplicateUserError", "300x5", error_id)
+        finally:
+            invalidate_user(email)
         message = f"User registered successfully with {provider.upper()}"
     else:
         message = f"User logged in successfully with {provider.upper()}"
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+from common.jwt_verifier import JWKSVerifier
+
+logger = logging.getLogger("oidc")
+
+# id_token signatures accepted, whatever else a provider advertises
+ID_TOKEN_ALGORITHMS = {"RS256", "RS384", "RS512", "PS256", "ES256", "ES384", "EdDSA"}
+
+
+class OIDCProvider:
+    """
+    Discovery document and signing keys of an OpenID Connect provider, cached per
+    process so that verifying an id_token is local CPU work in the common case.
+
+    The discovery document is refetched after ``metadata_ttl`` seconds and the
+    key set after ``jwks_ttl`` seconds, or early when an id_token is signed with
+    an unknown key (at most every ``min_refresh_interval`` seconds). Concurrent
+    refetches share a single request, and a provider that is down is served from
+    the stale cache.
+    """
+
+    def __init__(
+        self,
+        metadata_url: str,
+        client_id: str,
+        metadata_ttl: float = 86400,
+        jwks_ttl: float = 3600,
+        min_refresh_interval: float = 30,
+        timeout: float = 5,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.metadata_url = metadata_url
+        self.client_id = client_id
+        self.metadata_ttl = metadata_ttl
+        self.jwks_ttl = jwks_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._client = http_client
+        self._owns_client = http_client is None
+        self._metadata: Optional[dict] = None
+        self._metadata_at = 0.0
+        self._metadata_task: Optional[asyncio.Task] = None
+        self._verifier: Optional[JWKSVerifier] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def _fetch_metadata(self):
+        try:
+            response = await self._get_client().get(
+                self.metadata_url, timeout=self.timeout
+            )
+            response.raise_for_status()
+            metadata = response.json()
+            if "issuer" not in metadata or "jwks_uri" not in metadata:
+                raise ValueError("Discovery document without issuer or jwks_uri")
+        except (httpx.HTTPError, ValueError) as e:
+            if self._metadata is None:
+                raise
+            logger.warning("Using the cached %s metadata: %s", self.metadata_url, e)
+            return
+        self._metadata = metadata
+        self._metadata_at = time.monotonic()
+
+    async def metadata(self) -> dict:
+        """
+        Returns the provider's discovery document.
+
+        Raises:
+            httpx.HTTPError, ValueError: If it was never fetched and cannot be fetched.
+        """
+        if (
+            self._metadata is None
+            or time.monotonic() - self._metadata_at >= self.metadata_ttl
+        ):
+            if self._metadata_task is None or self._metadata_task.done():
+                self._metadata_task = asyncio.create_task(self._fetch_metadata())
+            await asyncio.shield(self._metadata_task)
+        return self._metadata
+
+    async def verify_id_token(self, id_token: str) -> dict:
+        """
+        Verifies an id_token's signature, expiry, audience and issuer.
+
+        Returns:
+            The decoded claims of the token.
+
+        Raises:
+            ValueError: If the token is expired or invalid.
+        """
+        metadata = await self.metadata()
+        if self._verifier is None or self._verifier.jwks_url != metadata["jwks_uri"]:
+            if self._verifier is not None:
+                await self._verifier.close()
+            algorithms = [
+                alg
+                for alg in metadata.get("id_token_signing_alg_values_supported", [])
+                if alg in ID_TOKEN_ALGORITHMS
+            ]
+            self._verifier = JWKSVerifier(
+                metadata["jwks_uri"],
+                algorithms=algorithms or ["RS256"],
+                cache_ttl=self.jwks_ttl,
+                min_refresh_interval=self.min_refresh_interval,
+                timeout=self.timeout,
+                audience=self.client_id,
+                http_client=self._get_client(),
+            )
+        claims = await self._verifier.verify(id_token)
+        # Google also issues tokens with the issuer minus its scheme
+        issuer = metadata["issuer"]
+        if claims.get("iss") not in (issuer, issuer.removeprefix("https://")):
+            raise ValueError("Invalid token: Invalid issuer")
+        return claims
+
+    async def close(self):
+        if self._verifier is not None:
+            await self._verifier.close()
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import secrets
+import time
+from fastapi import HTTPException
+from prometheus_client import Counter
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    LOGIN_RATE_WINDOW,
+    LOGIN_RATE_LIMIT_IP,
+    LOGIN_RATE_LIMIT_EMAIL,
+)
+
+logger = logging.getLogger("ratelimit")
+
+RATE_LIMIT_DECISIONS = Counter(
+    "envybase_rate_limit_decisions_total",
+    "Rate limiter decisions, by limiter and result (allowed, rejected or error).",
+    ["limiter", "result"],
+)
+
+# Sliding window over sorted sets, one per key, scored by attempt time in ms.
+# An attempt is recorded in every key only if all of them are under their limit;
+# otherwise nothing is recorded and the wait until the oldest attempt of the
+# fullest key leaves the window is returned.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local member = ARGV[3]
+local wait = 0
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[3 + i]) then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        wait = math.max(wait, tonumber(oldest[2]) + window - now)
+    end
+end
+if wait > 0 then
+    return wait
+end
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+end
+return 0
+"""
+
+
+class SlidingWindowLimiter:
+    """
+    Redis sliding-window rate limiter shared by every process using the same Redis.
+
+    Each call to ``hit`` records one attempt under several keys at once, each with
+    its own limit, in a single round trip. If Redis is unavailable the limiter fails
+    open and lets the attempt through.
+    """
+
+    def __init__(self, name: str, redis, window_seconds: int):
+        """
+        Args:
+            name: Limiter name, prefixes its Redis keys and labels its metrics.
+            redis: An asyncio Redis client, or a compatible one such as
+                ``fakeredis.aioredis.FakeRedis`` for tests.
+            window_seconds: Length of the sliding window.
+        """
+        self.name = name
+        self.redis = redis
+        self.window_ms = window_seconds * 1000
+        self._script = None
+
+    async def hit(self, limits: dict) -> float:
+        """
+        Records an attempt against every key of ``limits`` that has a positive limit.
+
+        Args:
+            limits: Maps a key (e.g. a client IP) to the attempts allowed per window.
+
+        Returns:
+            0 if the attempt is allowed, else the seconds until it would be.
+        """
+        limits = {key: limit for key, limit in limits.items() if limit > 0}
+        if not limits:
+            return 0
+        if self._script is None:
+            self._script = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
+        now_ms = int(time.time() * 1000)
+        try:
+            wait_ms = await self._script(
+                keys=[f"ratelimit:{self.name}:{key}" for key in limits],
+                args=[
+                    now_ms,
+                    self.window_ms,
+                    f"{now_ms}-{secrets.token_hex(4)}",
+                    *limits.values(),
+                ],
+            )
+        except (RedisError, OSError) as e:
+            RATE_LIMIT_DECISIONS.labels(self.name, "error").inc()
+            logger.warning("Rate limiter '%s' unavailable, allowing: %s", self.name, e)
+            return 0
+        if wait_ms:
+            RATE_LIMIT_DECISIONS.labels(self.name, "rejected").inc()
+            return wait_ms / 1000
+        RATE_LIMIT_DECISIONS.labels(self.name, "allowed").inc()
+        return 0
+
+
+redis_client = Redis(
+    host=REDIS_HOST,
+    port=int(REDIS_PORT),
+    # Throttling must not slow logins down when Redis struggles, it fails open
+    socket_timeout=0.5,
+    socket_connect_timeout=0.5,
+)
+login_limiter = SlidingWindowLimiter("login", redis_client, LOGIN_RATE_WINDOW)
+
+
+async def check_login_rate(ip: str, email: str):
+    """
+    Counts a login attempt for the client IP and the email, before any other work.
+
+    The email is hashed so that the Redis keys hold no addresses.
+
+    Raises:
+        HTTPException: If either has too many recent attempts. (Error code: 300x10)
+    """
+    email_key = hashlib.sha256(email.lower().encode()).hexdigest()[:32]
+    wait = await login_limiter.hit(
+        {f"ip:{ip}": LOGIN_RATE_LIMIT_IP, f"email:{email_key}": LOGIN_RATE_LIMIT_EMAIL}
+    )
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts, please retry later --ENVYSTART--ERROR:300x10--ENVYEND--",
+            headers={"Retry-After": str(max(1, round(wait)))},
+        )
+
+
+async def close_redis():
+    await redis_client.aclose()
@@ -1,41 +1,269 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from database import get_logs
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
 
 stats_router = APIRouter()
 
+# Hard upper bound for /stats/logs pages, whatever the client asks for
+LOGS_PAGE_SIZE_MAX = 200
+# Per-path latency is reported for the busiest paths only
+LATENCY_PATHS_MAX = 50
+BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+# Caps the number of timeline buckets a single request can produce
+BUCKETS_MAX = 2000
+SERVICE_PATTERN = r"^[a-z0-9_-]{1,32}$"
+
+
+def _time_window(start: Optional[datetime], end: Optional[datetime]):
+    """
+    Normalizes an optional [start, end) window to timezone-aware UTC datetimes.
+
+    Defaults to the last 24 hours, naive datetimes are treated as UTC.
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=1)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+
+def _encode_cursor(log: dict) -> str:
+    raw = f"{log['timestamp'].isoformat()}|{log['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, object_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
 @stats_router.get("/stats")
-async def get_stats():
+async def get_stats(
+    start: Optional[datetime] = Query(None, description="Window start, ISO 8601"),
+    end: Optional[datetime] = Query(None, description="Window end, ISO 8601"),
+    bucket: Literal["minute", "hour", "day"] = Query(
+        "hour", description="Size of the timeline buckets"
+    ),
+    service: str = Query("auth", pattern=SERVICE_PATTERN),
+):
     """
-    Retrieves authentication log entries and their total count from the database.
+    Aggregates request logs of a service over a time window on the database server.
+
+    Runs a single aggregation returning totals and error rates, request counts per
+    time bucket, a status-code breakdown and p50/p95/p99 latency of the busiest paths.
+    Percentiles need MongoDB 7.0 or newer.
 
     Returns:
-        A dictionary with the total number of authentication logs and a list of log entries,
-        each containing method, path, client, timestamp, and status code (if available).
+        A dictionary with the window, "summary", "timeline", "status_codes" and "latency".
 
     Raises:
-        HTTPException: If an error occurs while accessing or processing the database.
+        HTTPException: If the window is invalid (400) or the aggregation fails (500).
     """
+    start, end = _time_window(start, end)
+    if (end - start).total_seconds() / BUCKET_SECONDS[bucket] > BUCKETS_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Window too large for '{bucket}' buckets, use a larger bucket",
+        )
+
+    is_error = {"$cond": [{"$gte": ["$status_code", 500]}, 1, 0]}
+    is_client_error = {
+        "$cond": [
+            {
+                "$and": [
+                    {"$gte": ["$status_code", 400]},
+                    {"$lt": ["$status_code", 500]},
+                ]
+            },
+            1,
+            0,
+        ]
+    }
+    error_rate = {
+        "$cond": [
+            {"$gt": ["$requests", 0]},
+            {"$divide": ["$server_errors", "$requests"]},
+            0,
+        ]
+    }
+    pipeline = [
+        {
+            "$match": {
+                "meta.service": service,
+                "timestamp": {"$gte": start, "$lt": end},
+            }
+        },
+        {
+            "$facet": {
+                "summary": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "requests": {"$sum": 1},
+                            "client_errors": {"$sum": is_client_error},
+                            "server_errors": {"$sum": is_error},
+                        }
+                    },
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "error_rate": error_rate,
+                            "requests": 1,
+                            "client_errors": 1,
+                            "server_errors": 1,
+                        }
+                    },
+                ],
+                "timeline": [
+                    {
+                        "$group": {
+                            "_id": {
+                                "$dateTrunc": {"date": "$timestamp", "unit": bucket}
+                            },
+                            "requests": {"$sum": 1},
+                            "server_errors": {"$sum": is_error},
+                        }
+                    },
+                    {"$sort": {"_id": 1}},
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "start": "$_id",
+                            "requests": 1,
+                            "server_errors": 1,
+                            "error_rate": error_rate,
+                        }
+                    },
+                ],
+                "status_codes": [
+                    {"$group": {"_id": "$status_code", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$project": {"_id": 0, "status_code": "$_id", "count": 1}},
+                ],
+                "latency": [
+                    {"$match": {"duration_ms": {"$type": "number"}}},
+                    {
+                        "$group": {
+                            "_id": {"method": "$method", "path": "$meta.path"},
+                            "requests": {"$sum": 1},
+                            "percentiles": {
+                                "$percentile": {
+                                    "input": "$duration_ms",
+                                    "p": [0.5, 0.95, 0.99],
+                                    "method": "approximate",
+                                }
+                            },
+                        }
+                    },
+                    {"$sort": {"requests": -1}},
+                    {"$limit": LATENCY_PATHS_MAX},
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "method": "$_id.method",
+                            "path": "$_id.path",
+                            "requests": 1,
+                            "p50_ms": {"$arrayElemAt": ["$percentiles", 0]},
+                            "p95_ms": {"$arrayElemAt": ["$percentiles", 1]},
+                            "p99_ms": {"$arrayElemAt": ["$percentiles", 2]},
+                        }
+                    },
+                ],
+            }
+        },
+    ]
     try:
-        logs = get_logs()
-        total_count = await logs.count_documents({"service": "auth"})
-        log_entries = []
-        async for log in logs.find({"service": "auth"}):
-            log_entries.append(
-                {
-                    "method": log["method"],
-                    "path": log["path"],
-                    "client": log["client"],
-                    "timestamp": log["timestamp"],
-                    "status_code": log.get("status_code", None),
-                }
-            )
-        return {
-            "total_count": total_count,
-            "logs": log_entries,
-        }
+        result = await get_logs().aggregate(pipeline).to_list(length=1)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving statistics: {str(e)}",
         )
+    facets = result[0] if result else {}
+    summary = facets.get("summary") or [
+        {"requests": 0, "client_errors": 0, "server_errors": 0, "error_rate": 0}
+    ]
+    return {
+        "service": service,
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "summary": summary[0],
+        "timeline": facets.get("timeline", []),
+        "status_codes": facets.get("status_codes", []),
+        "latency": facets.get("latency", []),
+    }
+
+
+@stats_router.get("/stats/logs")
+async def get_logs_page(
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=LOGS_PAGE_SIZE_MAX),
+    start: Optional[datetime] = Query(None, description="Window start, ISO 8601"),
+    end: Optional[datetime] = Query(None, description="Window end, ISO 8601"),
+    service: str = Query("auth", pattern=SERVICE_PATTERN),
+):
+    """
+    Returns one page of raw log entries of a service, newest first.
+
+    Pages are keyed on (timestamp, _id) so every page costs one bounded index scan,
+    however deep the client pages.
+
+    Returns:
+        A dictionary with the log entries and the cursor of the next page, which is
+        None on the last page.
+
+    Raises:
+        HTTPException: If the window or cursor is invalid (400) or the query fails (500).
+    """
+    start, end = _time_window(start, end)
+    query = {"meta.service": service, "timestamp": {"$gte": start, "$lt": end}}
+    if cursor:
+        timestamp, object_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": object_id}},
+        ]
+    projection = {
+        "method": 1,
+        "meta.path": 1,
+        "raw_path": 1,
+        "client": 1,
+        "timestamp": 1,
+        "status_code": 1,
+        "duration_ms": 1,
+        "error": 1,
+    }
+    try:
+        logs = (
+            await get_logs()
+            .find(query, projection)
+            .sort([("timestamp", -1), ("_id", -1)])
+            .limit(limit)
+            .to_list(length=limit)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving logs: {str(e)}",
+        )
+    next_cursor = _encode_cursor(logs[-1]) if len(logs) == limit else None
+    for log in logs:
+        log["_id"] = str(log["_id"])
+        # Unmatched routes share one meta path, their URL is in 'raw_path'
+        log["path"] = log.pop("raw_path", None) or log.pop("meta", {}).get("path")
+        log.pop("meta", None)
+    return {"logs": logs, "next_cursor": next_cursor}
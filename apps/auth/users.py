@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from prometheus_client import Counter
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from database import get_users
+
+USER_CACHE_LOOKUPS = Counter(
+    "envybase_user_cache_lookups_total",
+    "User lookups by email, by cache result (hit or miss).",
+    ["result"],
+)
+
+# Fields the login and OAuth2 flows need, the rest of the profile is never loaded
+USER_AUTH_FIELDS = {"_id": 1, "email": 1, "password": 1, "provider": 1}
+
+
+class UserCache:
+    """
+    LRU cache of found user lookups.
+
+    Entries are dropped by ``invalidate`` whenever this process writes the user, and
+    expire on their own for writes made elsewhere. Missing users are not cached: a
+    user registered by another worker would be refused until the entry expired, and
+    logins with unknown emails are already throttled by the login rate limits.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        # Bumped by every invalidation, see set()
+        self.generation = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+
+    def set(self, key: str, user: Optional[dict], generation: int):
+        """
+        Caches a lookup result read while the cache was at ``generation``.
+
+        A result read before an invalidation may predate the write that caused it,
+        such a result is not cached.
+        """
+        if (
+            user is None
+            or self.ttl <= 0
+            or self.max_size <= 0
+            or generation != self.generation
+        ):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self.generation += 1
+        self._entries.pop(key, None)
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+async def find_user_by_email(email: str) -> Optional[dict]:
+    """
+    Looks up the authentication fields of a user by email, through the cache.
+
+    Returns:
+        A dictionary with '_id', 'email', 'password' (absent for OAuth2 users) and
+        'provider' (absent for password users), or None if no user has this email.
+    """
+    user = user_cache.get(email)
+    if user is not None:
+        USER_CACHE_LOOKUPS.labels("hit").inc()
+    else:
+        USER_CACHE_LOOKUPS.labels("miss").inc()
+        generation = user_cache.generation
+        user = await get_users().find_one({"email": email}, USER_AUTH_FIELDS)
+        user_cache.set(email, user, generation)
+    return dict(user) if user else None
+
+
+def invalidate_user(email: str):
+    """
+    Drops the cached lookup of a user, call it after every write to that user.
+    """
+    user_cache.invalidate(email)
@@ -1,31 +1,86 @@
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from typing import Dict
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import jwt
-from config import ISSUER, AUTH_KEY
+from keys import signing_keys
+from config import (
+    ISSUER,
+    AUTH_KEY,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_ALGORITHM,
+    PASSWORD_HASH_SCHEME,
+    BCRYPT_ROUNDS,
+    ARGON2_TIME_COST,
+    ARGON2_MEMORY_COST,
+    ARGON2_PARALLELISM,
+)
 import string
 import secrets
 
-ALGORITHM = "HS256"
+
+ARGON2_PREFIX = "$argon2"
+# Hashes argon2id with the configured parameters
+argon2_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
 
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
+    """Hash a password using the configured scheme and cost"""
+    if PASSWORD_HASH_SCHEME == "argon2":
+        return argon2_hasher.hash(password)
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode(), salt).decode()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash, whichever scheme produced it"""
+    if hashed_password.startswith(ARGON2_PREFIX):
+        try:
+            return argon2_hasher.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
     return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Checks whether a stored hash was made with another scheme or cost than the
+    configured one, i.e. whether it should be replaced on the next login.
+    """
+    if PASSWORD_HASH_SCHEME == "argon2":
+        if not hashed_password.startswith(ARGON2_PREFIX):
+            return True
+        return argon2_hasher.check_needs_rehash(hashed_password)
+    try:
+        # bcrypt hashes look like $2b$<cost>$<salt and hash>
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
 def create_jwt_token(data: Dict) -> str:
-    """Creates a JWT token"""
+    """Creates a JWT token expiring after ACCESS_TOKEN_EXPIRE_MINUTES"""
     to_encode = data.copy()
-    to_encode.update({"iat": datetime.now(timezone.utc), "iss": ISSUER})
-
-    return jwt.encode(to_encode, AUTH_KEY, algorithm=ALGORITHM)
+    now = datetime.now(timezone.utc)
+    to_encode.update(
+        {
+            "iat": now,
+            "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+            "iss": ISSUER,
+        }
+    )
+
+    if signing_keys is None:
+        return jwt.encode(to_encode, AUTH_KEY, algorithm=JWT_ALGORITHM)
+    kid, private_key = signing_keys.active()
+    return jwt.encode(
+        to_encode, private_key, algorithm=JWT_ALGORITHM, headers={"kid": kid}
+    )
 
 
 def decode_jwt_token(token: str) -> Dict:
@@ -42,12 +97,21 @@ def decode_jwt_token(token: str) -> Dict:
         ValueError: If the token is expired or invalid.
     """
     try:
-        payload = jwt.decode(token, AUTH_KEY, algorithms=[ALGORITHM])
+        key = AUTH_KEY
+        if signing_keys is not None:
+            key = signing_keys.public_key(jwt.get_unverified_header(token).get("kid"))
+            if key is None:
+                raise ValueError("Invalid token: Unknown signing key")
+        payload = jwt.decode(
+            token,
+            key,
+            algorithms=[JWT_ALGORITHM],
+            issuer=ISSUER,
+            options={"require": ["exp", "iat", "sub"]},
+        )
         return payload
     except jwt.ExpiredSignatureError:
-        raise ValueError(
-            "Token has expired"
-        )  # This shouldn't happen, the JWT creator doesn't set an expiration time
+        raise ValueError("Token has expired")
     except jwt.InvalidTokenError as e:
         raise ValueError(f"Invalid token: {str(e)}")
 
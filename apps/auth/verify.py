@@ -0,0 +1,142 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from prometheus_client import Counter
+from config import VERIFY_CACHE_SIZE
+from keys import signing_keys
+from utils import decode_jwt_token
+from common.jwt_verifier import project_of
+
+verify_router = APIRouter()
+
+TOKEN_VERIFICATIONS = Counter(
+    "envybase_token_verifications_total",
+    "Access token verifications by /verify, by result (hit, miss or invalid).",
+    ["result"],
+)
+
+
+class TokenCache:
+    """
+    LRU cache of decoded access tokens, keyed by the SHA-256 of the token.
+
+    Entries are valid until the token's own 'exp', so a cached token never outlives
+    its expiry. Only the hash is kept as key, never the token itself.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, dict] = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[dict]:
+        claims = self._entries.get(key)
+        if claims is None:
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def set(self, key: bytes, claims: dict):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = claims
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(VERIFY_CACHE_SIZE)
+
+# Lets verifiers cache the key set for a while, they refetch it on an unknown kid
+JWKS_MAX_AGE = 300
+
+
+def get_access_token(request: Request) -> Optional[str]:
+    """
+    Returns the access token of a request, from the 'Authorization: Bearer' header
+    or else the 'access_token' cookie.
+    """
+    authorization = request.headers.get("authorization")
+    if authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token.strip():
+            return token.strip()
+    return request.cookies.get("access_token")
+
+
+def verify_access_token(token: str) -> dict:
+    """
+    Verifies an access token, through the cache.
+
+    Returns:
+        The decoded claims of the token.
+
+    Raises:
+        ValueError: If the token is expired or invalid.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is not None:
+        TOKEN_VERIFICATIONS.labels("hit").inc()
+        return claims
+    try:
+        claims = decode_jwt_token(token)
+    except ValueError:
+        TOKEN_VERIFICATIONS.labels("invalid").inc()
+        raise
+    TOKEN_VERIFICATIONS.labels("miss").inc()
+    token_cache.set(key, claims)
+    return claims
+
+
+@verify_router.get("/verify", summary="Verify an access token")
+async def verify(request: Request, response: Response):
+    """
+    Verifies the access token of a request, for use with nginx auth_request.
+
+    The token is taken from the 'Authorization: Bearer' header or the 'access_token'
+    cookie. On success the identity is returned in the X-Envy-User (the token subject),
+    X-Envy-Project (see ``project_of``) and X-Envy-Expires (expiry as a Unix
+    timestamp) headers, which nginx forwards to the protected service.
+
+    Raises:
+        HTTPException: If the token is missing, invalid or expired. (Error code: 300x9)
+
+    Returns:
+        A JSON object with the token subject and expiry.
+    """
+    token = get_access_token(request)
+    try:
+        if not token:
+            raise ValueError("No access token")
+        claims = verify_access_token(token)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=401,
+            detail=f"{str(e)} --ENVYSTART--ERROR:300x9--ENVYEND--",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    response.headers["X-Envy-User"] = claims["sub"]
+    response.headers["X-Envy-Project"] = project_of(claims["sub"])
+    response.headers["X-Envy-Expires"] = str(claims["exp"])
+    return {"status": "success", "sub": claims["sub"], "exp": claims["exp"]}
+
+
+@verify_router.get("/.well-known/jwks.json", summary="Public token signing keys")
+async def jwks():
+    """
+    Publishes the public keys access tokens are signed with, as a JSON Web Key Set.
+
+    Services verify tokens locally against these keys, matched by the token's 'kid'
+    header. The set is empty with HS256, whose key is a shared secret.
+    """
+    body = signing_keys.jwks() if signing_keys is not None else b'{"keys": []}'
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Cache-Control": f"public, max-age={JWKS_MAX_AGE}"},
+    )
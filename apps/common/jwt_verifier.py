@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Optional
+
+import httpx
+import jwt
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger("jwt_verifier")
+
+
+class JWKSVerifier:
+    """
+    Verifies access tokens issued by the auth service against its published JWKS.
+
+    The key set is fetched from ``jwks_url`` and cached for ``cache_ttl`` seconds,
+    so signatures are checked in-process without a request to auth per token. A
+    token signed with a key the cache does not know yet (after a key rotation)
+    triggers an early refetch, at most once every ``min_refresh_interval`` seconds
+    so that tokens with made-up key IDs cannot flood auth. Concurrent refetches
+    share a single request.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        issuer: Optional[str] = None,
+        algorithms=("RS256", "EdDSA"),
+        cache_ttl: float = 300,
+        min_refresh_interval: float = 30,
+        timeout: float = 5,
+        audience: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        """
+        Args:
+            jwks_url: URL of the JSON Web Key Set to verify signatures with.
+            issuer: Required 'iss' claim, None skips the check.
+            algorithms: Signature algorithms accepted.
+            cache_ttl: Seconds the key set is used before it is refetched.
+            min_refresh_interval: Minimum seconds between refetches.
+            timeout: Timeout of a key set fetch, in seconds.
+            audience: Required 'aud' claim, None for tokens without audience.
+            http_client: Client to fetch the key set with, one is created (and
+                closed by ``close``) if omitted.
+        """
+        self.jwks_url = jwks_url
+        self.issuer = issuer
+        self.audience = audience
+        self.algorithms = list(algorithms)
+        self.cache_ttl = cache_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._keys: dict = {}
+        self._fetched_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._client = http_client
+        self._owns_client = http_client is None
+
+    async def _fetch(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            response = await self._client.get(self.jwks_url, timeout=self.timeout)
+            response.raise_for_status()
+            jwk_set = jwt.PyJWKSet.from_dict(response.json())
+        except (httpx.HTTPError, ValueError, jwt.PyJWKSetError) as e:
+            logger.warning("Could not fetch the JWKS from %s: %s", self.jwks_url, e)
+            # Keep any stale keys and retry once the refresh interval has passed
+            self._fetched_at = (
+                time.monotonic() - self.cache_ttl + self.min_refresh_interval
+            )
+            return
+        self._keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+        self._fetched_at = time.monotonic()
+
+    async def refresh(self):
+        """
+        Refetches the key set, joining a refetch already in progress.
+        """
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+        # Shielded so a cancelled request does not abort the fetch others wait on
+        await asyncio.shield(self._refresh_task)
+
+    async def _get_key(self, kid: str):
+        now = time.monotonic()
+        if self._fetched_at is None or now - self._fetched_at >= self.cache_ttl:
+            await self.refresh()
+        key = self._keys.get(kid)
+        if key is None and (
+            self._fetched_at is None
+            or time.monotonic() - self._fetched_at >= self.min_refresh_interval
+        ):
+            await self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    async def verify(self, token: str) -> dict:
+        """
+        Verifies a token's signature, expiry and issuer.
+
+        Returns:
+            The decoded claims of the token.
+
+        Raises:
+            ValueError: If the token is expired or invalid.
+        """
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError as e:
+            raise ValueError(f"Invalid token: {str(e)}")
+        if header.get("alg") not in self.algorithms:
+            raise ValueError("Invalid token: Unsupported algorithm")
+        key = await self._get_key(header.get("kid"))
+        if key is None:
+            raise ValueError("Invalid token: Unknown signing key")
+        try:
+            return jwt.decode(
+                token,
+                key.key,
+                algorithms=self.algorithms,
+                issuer=self.issuer,
+                audience=self.audience,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.ExpiredSignatureError:
+            raise ValueError("Token has expired")
+        except jwt.InvalidTokenError as e:
+            raise ValueError(f"Invalid token: {str(e)}")
+
+    async def close(self):
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
+
+
+def project_of(subject: str) -> str:
+    """
+    Returns the project of a token subject, which scopes its collections in the
+    database service. Subjects are emails, not valid project names, so a digest is
+    used.
+    """
+    return hashlib.sha256(subject.encode()).hexdigest()[:32]
+
+
+def token_dependency(verifier: Optional[JWKSVerifier]):
+    """
+    Builds a FastAPI dependency requiring a valid access token on a route.
+
+    The token is read from the 'Authorization: Bearer' header or the 'access_token'
+    cookie. With no verifier configured the dependency lets every request through,
+    leaving authentication to the proxy in front of the service.
+
+    Returns:
+        A dependency resolving to the token claims, or None without a verifier.
+    """
+
+    async def require_token(request: Request) -> Optional[dict]:
+        if verifier is None:
+            return None
+        token = request.cookies.get("access_token")
+        scheme, _, bearer = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and bearer.strip():
+            token = bearer.strip()
+        try:
+            if not token:
+                raise ValueError("No access token")
+            return await verifier.verify(token)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=401,
+                detail=f"{str(e)} --ENVYSTART--ERROR:300x9--ENVYEND--",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    return require_token
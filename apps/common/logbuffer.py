@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger("logs")
+
+
+class LogBuffer:
+    """
+    In-process buffer that batches request log documents into ``insert_many`` calls.
+
+    Documents are queued with :meth:`put` and written by a background task once
+    ``batch_size`` documents are pending or ``flush_interval`` seconds have passed,
+    whichever comes first. When the queue is full, documents are either dropped
+    (the default) or the caller waits up to ``block_timeout`` seconds for room.
+    """
+
+    def __init__(
+        self,
+        get_collection: Callable,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        block_timeout: float = 0.0,
+    ):
+        """
+        Args:
+            get_collection: Callable returning the Motor collection to write to.
+                Resolved on every flush so it can be created after the buffer.
+            max_size: Maximum number of queued documents.
+            batch_size: Number of documents written per ``insert_many`` call.
+            flush_interval: Maximum seconds a document waits before being flushed.
+            block_timeout: Seconds :meth:`put` waits for room when the queue is full.
+                ``0`` drops the document immediately instead of waiting.
+        """
+        self._get_collection = get_collection
+        self._max_size = max_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._block_timeout = block_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._batch: list = []
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        """
+        Starts the background flush task. Must be called from a running event loop.
+        """
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self._max_size)
+        self._task = asyncio.create_task(self._run(), name="log-buffer-flush")
+
+    async def put(self, doc: dict) -> bool:
+        """
+        Queues a log document for writing.
+
+        Returns:
+            True if the document was queued, False if it was dropped.
+        """
+        if self._queue is None:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(doc)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self._block_timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.put(doc), self._block_timeout)
+                return True
+            except TimeoutError:
+                pass
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            logger.warning("Log buffer full, %d documents dropped so far", self.dropped)
+        return False
+
+    async def _run(self):
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await queue.get())
+            deadline = loop.time() + self._flush_interval
+            while len(self._batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                # asyncio.timeout rather than wait_for, which can swallow a
+                # cancellation arriving together with an item on Python < 3.12
+                try:
+                    async with asyncio.timeout(timeout):
+                        self._batch.append(await queue.get())
+                except TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            # Shielded so that stop() never abandons a batch halfway through a write
+            self._inflight = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._inflight)
+
+    async def _write(self, batch: list):
+        try:
+            await self._get_collection().insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("Failed to write %d log documents: %s", len(batch), e)
+
+    async def stop(self):
+        """
+        Stops the background task and writes every document still queued.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight is not None and not self._inflight.done():
+            await self._inflight
+        self._inflight = None
+        queue, self._queue = self._queue, None
+        batch, self._batch = self._batch, []
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+            if len(batch) >= self._batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger("logs")
+
+LOGS_COLLECTION = "logs"
+# Indexes backing the stats queries, all of them filter on the service first
+LOGS_INDEXES = [
+    [("meta.service", ASCENDING), ("timestamp", DESCENDING)],
+    [("meta.service", ASCENDING), ("meta.path", ASCENDING), ("timestamp", DESCENDING)],
+]
+
+
+def log_entry(service: str, path: str, **fields) -> dict:
+    """
+    Builds a log document in the shape of the logs time-series collection.
+
+    Args:
+        service: Service writing the entry, stored in the meta field.
+        path: Route template or operation the entry is about, stored in the meta field.
+        **fields: Measurements of the entry, e.g. status_code or error.
+    """
+    fields["timestamp"] = datetime.now(timezone.utc)
+    fields["meta"] = {"service": service, "path": path}
+    return fields
+
+
+async def ensure_logs_collection(db, retention_seconds: int = 0):
+    """
+    Provisions the shared logs collection as a time-series collection.
+
+    Creates the collection with 'timestamp' as time field and 'meta' (service and path)
+    as meta field, keeps its expiry in line with ``retention_seconds`` and ensures the
+    secondary indexes used by the stats endpoints. Every service calls this at startup,
+    so losing a creation race to another service is expected and ignored.
+
+    A pre-existing regular logs collection cannot be converted in place; it gets a TTL
+    index on 'timestamp' instead and a warning is logged.
+
+    Args:
+        db: The Motor database holding the logs collection.
+        retention_seconds: Age after which log entries expire, 0 keeps them forever.
+    """
+    options = {
+        "timeseries": {
+            "timeField": "timestamp",
+            "metaField": "meta",
+            "granularity": "seconds",
+        }
+    }
+    if retention_seconds:
+        options["expireAfterSeconds"] = retention_seconds
+    try:
+        await db.create_collection(LOGS_COLLECTION, **options)
+    except CollectionInvalid:
+        pass  # Already exists
+    except OperationFailure as e:
+        # NamespaceExists means another service won the race, anything else
+        # (e.g. a server without time-series support) falls back to a TTL index
+        if e.code != 48:
+            logger.warning("Could not create the time-series logs collection: %s", e)
+
+    result = await db.command("listCollections", filter={"name": LOGS_COLLECTION})
+    info = result["cursor"]["firstBatch"]
+    logs = db[LOGS_COLLECTION]
+    if info and info[0].get("type") == "timeseries":
+        current = info[0].get("options", {}).get("expireAfterSeconds")
+        if current != (retention_seconds or None):
+            await db.command(
+                "collMod",
+                LOGS_COLLECTION,
+                expireAfterSeconds=retention_seconds or "off",
+            )
+    else:
+        logger.warning(
+            "'%s' is not a time-series collection, using a TTL index for retention",
+            LOGS_COLLECTION,
+        )
+        if retention_seconds:
+            try:
+                await logs.create_index(
+                    "timestamp",
+                    name="timestamp_ttl",
+                    expireAfterSeconds=retention_seconds,
+                )
+            except OperationFailure as e:
+                if e.code != 85:  # IndexOptionsConflict, the retention changed
+                    raise
+                await db.command(
+                    "collMod",
+                    LOGS_COLLECTION,
+                    index={
+                        "name": "timestamp_ttl",
+                        "expireAfterSeconds": retention_seconds,
+                    },
+                )
+    for keys in LOGS_INDEXES:
+        await logs.create_index(keys)
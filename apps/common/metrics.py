@@ -0,0 +1,157 @@
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+# With several uvicorn workers every process writes its samples to
+# PROMETHEUS_MULTIPROC_DIR and /metrics merges them, so counts add up per service
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUESTS = Counter(
+    "envybase_http_requests_total",
+    "HTTP requests handled, by route template and status code.",
+    ["service", "method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "envybase_http_request_duration_seconds",
+    "HTTP request latency, by route template.",
+    ["service", "method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+MONGO_POOL_OPEN = Gauge(
+    "envybase_mongo_pool_connections",
+    "Open connections in the Motor connection pools.",
+    ["service"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "envybase_mongo_pool_checked_out_connections",
+    "Connections currently checked out of the Motor connection pools.",
+    ["service"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "envybase_mongo_pool_checkout_failures_total",
+    "Failed connection checkouts, e.g. wait queue timeouts.",
+    ["service", "reason"],
+)
+EVENT_LOOP_LAG = Gauge(
+    "envybase_event_loop_lag_seconds",
+    "Delay of the last event loop probe beyond its scheduled time.",
+    ["service"],
+    multiprocess_mode="livemax",
+)
+
+# Paths that did not match any route share one label to keep cardinality bounded
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def observe_request(service, method, route, status_code, duration_seconds):
+    """
+    Records one finished HTTP request in the request counter and latency histogram.
+    """
+    REQUESTS.labels(service, method, route, status_code).inc()
+    REQUEST_LATENCY.labels(service, method, route).observe(duration_seconds)
+
+
+def metrics_response() -> Response:
+    """
+    Renders every metric in the Prometheus text exposition format.
+    """
+    registry = REGISTRY
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Pymongo pool listener keeping the Motor connection pool gauges up to date.
+
+    Pass an instance to ``AsyncIOMotorClient(event_listeners=[...])``.
+    """
+
+    def __init__(self, service: str):
+        self.open = MONGO_POOL_OPEN.labels(service)
+        self.checked_out = MONGO_POOL_CHECKED_OUT.labels(service)
+        self.service = service
+
+    def connection_created(self, event):
+        self.open.inc()
+
+    def connection_closed(self, event):
+        self.open.dec()
+
+    def connection_checked_out(self, event):
+        self.checked_out.inc()
+
+    def connection_checked_in(self, event):
+        self.checked_out.dec()
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(self.service, event.reason).inc()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+class EventLoopMonitor:
+    """
+    Background task measuring how late the event loop runs a scheduled wakeup.
+
+    A loop blocked by CPU-bound work (e.g. password hashing) shows up as lag.
+    """
+
+    def __init__(self, service: str, interval: float = 0.5):
+        self.gauge = EVENT_LOOP_LAG.labels(service)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="event-loop-monitor")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.gauge.set(max(loop.time() - scheduled, 0))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
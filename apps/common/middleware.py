@@ -0,0 +1,140 @@
+import json
+import logging
+import re
+import time
+from datetime import datetime, timezone
+
+from common import metrics
+
+logger = logging.getLogger("logs")
+
+ENVY_ERROR = re.compile(r"ERROR:(\w+)")
+# Only the start of an error body is kept, it is enough for the detail message
+MAX_ERROR_BODY = 2048
+
+
+def client_ip(scope, trust_cloudflare=False) -> str:
+    """
+    Returns the real client IP address of an ASGI request.
+
+    Uses the 'CF-Connecting-IP' header when behind Cloudflare, otherwise the 'X-Real-IP'
+    header set by nginx, falling back to the peer address or '0.0.0.0'.
+    """
+    wanted = b"cf-connecting-ip" if trust_cloudflare else b"x-real-ip"
+    for name, value in scope["headers"]:
+        if name == wanted:
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "0.0.0.0"
+
+
+def _error_detail(body: bytes) -> str:
+    text = body.decode("utf-8", "replace")
+    try:
+        detail = json.loads(text).get("detail", text)
+    except (ValueError, AttributeError):
+        return text
+    return detail if isinstance(detail, str) else json.dumps(detail)
+
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware that records one log document per HTTP request.
+
+    Captures the method, route template, client IP, status code and duration of the
+    whole request, plus the error detail of 4xx/5xx responses, and hands the document
+    to a LogBuffer. The request is also counted in the Prometheus metrics. Nothing is
+    formatted unless the matching log level is enabled.
+    """
+
+    def __init__(
+        self,
+        app,
+        service: str,
+        log_buffer,
+        trust_cloudflare=False,
+        exclude_paths=("/metrics",),
+    ):
+        """
+        Args:
+            app: The ASGI application to wrap.
+            service: Name stored in the meta field of every log document.
+            log_buffer: LogBuffer receiving the log documents.
+            trust_cloudflare: Read the client IP from 'CF-Connecting-IP'.
+            exclude_paths: Paths passed through without logging or metrics.
+        """
+        self.app = app
+        self.service = service
+        self.log_buffer = log_buffer
+        self.trust_cloudflare = trust_cloudflare
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        error_body = None
+
+        async def send_wrapper(message):
+            nonlocal status_code, error_body
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if status_code >= 400:
+                    error_body = bytearray()
+            elif error_body is not None and len(error_body) < MAX_ERROR_BODY:
+                error_body += message.get("body", b"")[
+                    : MAX_ERROR_BODY - len(error_body)
+                ]
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            status_code = 500
+            error = str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            duration_ms = duration * 1000
+            # FastAPI stores the matched route in the scope, its path is the template
+            # Unmatched paths (scanners, typos) share one label and one time-series
+            # bucket, the raw path is kept as a measurement instead
+            route = scope.get("route")
+            path = route.path if route is not None else metrics.UNMATCHED_ROUTE
+            metrics.observe_request(
+                self.service, scope["method"], path, status_code, duration
+            )
+            doc = {
+                "timestamp": datetime.now(timezone.utc),
+                "meta": {"service": self.service, "path": path},
+                "method": scope["method"],
+                "client": client_ip(scope, self.trust_cloudflare),
+                "status_code": status_code,
+                "duration_ms": duration_ms,
+            }
+            if route is None:
+                doc["raw_path"] = scope["path"]
+            if error is None and error_body:
+                error = _error_detail(bytes(error_body))
+            if error is not None:
+                doc["error"] = error
+                match = ENVY_ERROR.search(error)
+                if match:
+                    doc["envy_error"] = match.group(1)
+            level = logging.ERROR if status_code >= 500 else logging.INFO
+            if logger.isEnabledFor(level):
+                logger.log(
+                    level,
+                    "%s %s %s %d %.1fms client=%s",
+                    self.service,
+                    doc["method"],
+                    scope["path"] if route is None else path,
+                    status_code,
+                    duration_ms,
+                    doc["client"],
+                )
+            await self.log_buffer.put(doc)
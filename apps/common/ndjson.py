@@ -0,0 +1,29 @@
+from fastapi import Request
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Longest accepted line of an upload, longer lines are reported and skipped
+MAX_LINE_BYTES = 64 * 1024
+
+
+def is_ndjson(content_type: str) -> bool:
+    """Whether a Content-Type or Accept header names newline-delimited JSON."""
+    return NDJSON_MEDIA_TYPE in (content_type or "")
+
+
+async def read_lines(request: Request, max_line_bytes: int = MAX_LINE_BYTES):
+    """
+    Yields the lines of a request body as it arrives, None in place of lines
+    longer than ``max_line_bytes``, so an upload is never held in memory whole.
+    """
+    buffer = b""
+    too_long = False
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            yield None if too_long or len(line) > max_line_bytes else line
+            too_long = False
+        if len(buffer) > max_line_bytes:
+            too_long = True
+            buffer = b""
+    if too_long or buffer.strip():
+        yield None if too_long else buffer
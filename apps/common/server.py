@@ -0,0 +1,88 @@
+import glob
+import importlib.util
+import os
+import sys
+import tempfile
+
+# Production server settings, shared by every service
+BACKLOG = int(os.getenv("BACKLOG", 2048))
+# Longer than the proxy's upstream keep-alive, so idle connections are closed by
+# nginx rather than under a request it is sending
+KEEPALIVE_TIMEOUT = int(os.getenv("KEEPALIVE_TIMEOUT", 75))
+# Seconds in-flight requests get to finish on shutdown before they are cut off
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+
+
+def worker_count() -> int:
+    """
+    Number of server processes of this service instance: WEB_CONCURRENCY, or one
+    per CPU core.
+    """
+    return max(1, int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+
+
+def per_worker(total: int, minimum: int = 1) -> int:
+    """
+    Splits a budget meant for a whole service instance (e.g. MongoDB connections)
+    between its server processes. Outside the production launcher, a single process
+    gets all of it.
+    """
+    return max(minimum, total // max(1, int(os.getenv("WEB_CONCURRENCY", 1))))
+
+
+def _prepare_metrics_dir(workers: int):
+    """
+    Points the workers at a clean Prometheus multiprocess directory, so /metrics
+    adds up the samples of all of them.
+    """
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        if workers == 1:
+            return
+        path = tempfile.mkdtemp(prefix="envybase-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    os.makedirs(path, exist_ok=True)
+    # Samples of processes from a previous run would be counted again
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def serve(app: str, host: str, port: int, reload: bool = False):
+    """
+    Runs a service, the entry point of its ``python main.py``.
+
+    By default a single uvicorn process is started, for development. With the
+    ``--production`` flag the service runs ``worker_count()`` processes on uvloop and
+    httptools (when installed), with a larger listen backlog and keep-alive, no
+    access log (requests are logged by RequestLogMiddleware) and a graceful drain of
+    in-flight requests on SIGTERM. The worker count is exported as WEB_CONCURRENCY,
+    so per-process pools can size themselves with ``per_worker``.
+
+    Args:
+        app: The application as an import string, e.g. 'main:app'.
+        host: Interface to listen on.
+        port: Port to listen on.
+        reload: Restart on code changes, development only.
+    """
+    import uvicorn
+
+    if "--production" not in sys.argv[1:]:
+        uvicorn.run(app, host=host, port=port, reload=reload)
+        return
+
+    workers = worker_count()
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    _prepare_metrics_dir(workers)
+    uvicorn.run(
+        app,
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        access_log=False,
+        server_header=False,
+    )
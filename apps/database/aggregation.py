@@ -0,0 +1,100 @@
+from typing import Optional
+
+from config import AGGREGATE_MAX_RESULTS, AGGREGATE_MAX_TIME_MS
+
+# Stages /aggregate accepts. Left out are the stages writing to collections ($out,
+# $merge), reading other collections ($lookup, $graphLookup, $unionWith), which
+# would escape the collection the request is scoped to, and reporting on the server
+# ($collStats, $indexStats, $currentOp...).
+ALLOWED_STAGES = {
+    "$match",
+    "$project",
+    "$addFields",
+    "$set",
+    "$unset",
+    "$group",
+    "$sort",
+    "$limit",
+    "$skip",
+    "$count",
+    "$sortByCount",
+    "$bucket",
+    "$bucketAuto",
+    "$facet",
+    "$unwind",
+    "$replaceRoot",
+    "$replaceWith",
+    "$sample",
+    "$densify",
+    "$fill",
+    "$setWindowFields",
+}
+# Operators running JavaScript on the server, refused anywhere in a pipeline
+FORBIDDEN_OPERATORS = {"$where", "$function", "$accumulator"}
+# Deepest nesting of documents and arrays in a pipeline
+MAX_DEPTH = 32
+
+
+def _check_expression(value, depth: int):
+    if depth > MAX_DEPTH:
+        raise ValueError("Pipeline nested too deeply")
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in FORBIDDEN_OPERATORS:
+                raise ValueError(f"Operator '{key}' is not allowed")
+            _check_expression(item, depth + 1)
+    elif isinstance(value, list):
+        for item in value:
+            _check_expression(item, depth + 1)
+
+
+def check_pipeline(pipeline: list, depth: int = 0) -> list:
+    """
+    Checks that a pipeline only uses ALLOWED_STAGES and no FORBIDDEN_OPERATORS,
+    including in the sub-pipelines of $facet.
+
+    Raises:
+        ValueError: If a stage or operator is not allowed, or a stage is malformed.
+        TypeError: If a $facet stage does not hold an object of pipelines.
+    """
+    for stage in pipeline:
+        if not isinstance(stage, dict) or len(stage) != 1:
+            raise ValueError("Each stage is an object with a single field")
+        name, spec = next(iter(stage.items()))
+        if name not in ALLOWED_STAGES:
+            raise ValueError(f"Stage '{name}' is not allowed")
+        if name == "$facet":
+            if not isinstance(spec, dict):
+                raise TypeError("$facet takes an object of pipelines")
+            for facet in spec.values():
+                if not isinstance(facet, list):
+                    raise TypeError("$facet takes an object of pipelines")
+                check_pipeline(facet, depth + 2)
+        else:
+            _check_expression(spec, depth + 1)
+    return pipeline
+
+
+def result_cap(limit: int) -> int:
+    """Most documents an aggregation returns: ``limit``, within AGGREGATE_MAX_RESULTS."""
+    return min(limit or AGGREGATE_MAX_RESULTS, AGGREGATE_MAX_RESULTS)
+
+
+def run_pipeline(
+    collection,
+    pipeline: list,
+    limit: int,
+    allow_disk_use: bool = False,
+    batch_size: Optional[int] = None,
+):
+    """
+    Starts an aggregation returning at most ``limit`` documents, within
+    AGGREGATE_MAX_TIME_MS on the server.
+
+    Returns:
+        The Motor command cursor.
+    """
+    options = {"allowDiskUse": allow_disk_use, "maxTimeMS": AGGREGATE_MAX_TIME_MS}
+    if batch_size:
+        options["batchSize"] = batch_size
+    return collection.aggregate([*pipeline, {"$limit": limit}], **options)
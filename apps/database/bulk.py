@@ -0,0 +1,167 @@
+import time
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from cache import select_cache
+from config import BULK_BATCH_SIZE
+from models import BulkOperation, Document
+
+# Errors listed in an insert report, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def new_document(document: Document) -> dict:
+    """
+    Builds the stored form of a document, as /insert does, with its '_id' assigned
+    up front so it can be reported whatever happens to the rest of the batch.
+    """
+    return {"_id": ObjectId(), **document.model_dump()}
+
+
+class InsertReport:
+    """
+    Outcome of a bulk insert, failures are referenced by the document's position
+    in the request.
+    """
+
+    def __init__(self, collection, with_ids: bool = True):
+        self.collection = collection
+        self.started = time.perf_counter()
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.inserted_ids = [] if with_ids else None
+
+    def error(self, index: int, message: str, code=None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "error": message, "code": code})
+
+    async def insert(self, documents: list, positions: list):
+        """
+        Inserts documents unordered, so a rejected one does not stop the others.
+
+        Args:
+            documents: Stored forms of the documents, see ``new_document``.
+            positions: Position of each of them in the request.
+        """
+        failed = set()
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                self.error(
+                    positions[error["index"]],
+                    error.get("errmsg", "Write error"),
+                    error.get("code"),
+                )
+        except PyMongoError as e:
+            failed = set(range(len(documents)))
+            for index in failed:
+                self.error(positions[index], str(e))
+        await select_cache.bump(self.collection)
+        self.inserted += len(documents) - len(failed)
+        if self.inserted_ids is not None:
+            self.inserted_ids.extend(
+                None if index in failed else str(document["_id"])
+                for index, document in enumerate(documents)
+            )
+
+    def as_dict(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        result = {
+            "status": "success",
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["index"]),
+            "errors_truncated": self.failed > len(self.errors),
+            "seconds": round(seconds, 3),
+        }
+        if self.inserted_ids is not None:
+            result["inserted_ids"] = self.inserted_ids
+        return result
+
+
+def _write_model(operation: BulkOperation):
+    if operation.update is not None:
+        model = UpdateMany if operation.many else UpdateOne
+        return model(
+            operation.update.query,
+            {"$set": operation.update.update},
+            upsert=operation.upsert,
+        )
+    model = DeleteMany if operation.many else DeleteOne
+    return model(operation.delete.query)
+
+
+async def bulk_write(collection, operations: list, ordered: bool) -> dict:
+    """
+    Applies mixed operations with bulk_write, BULK_BATCH_SIZE at a time.
+
+    Returns:
+        Aggregate counts and one result per operation: 'ok' (with the '_id' of an
+        inserted or upserted document), 'error' with the reason, or 'skipped' for
+        operations after a failure in an ordered write.
+    """
+    results = [{"status": "skipped"} for _ in operations]
+    counts = {"inserted": 0, "matched": 0, "modified": 0, "deleted": 0, "upserted": 0}
+    failed = 0
+    for offset in range(0, len(operations), BULK_BATCH_SIZE):
+        chunk = operations[offset : offset + BULK_BATCH_SIZE]
+        models = []
+        inserted_ids = {}
+        for index, operation in enumerate(chunk):
+            if operation.insert is not None:
+                document = new_document(operation.insert)
+                inserted_ids[index] = document["_id"]
+                models.append(InsertOne(document))
+            else:
+                models.append(_write_model(operation))
+        try:
+            details = (
+                await collection.bulk_write(models, ordered=ordered)
+            ).bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        except PyMongoError as e:
+            await select_cache.bump(collection)
+            for index in range(len(chunk)):
+                results[offset + index] = {"status": "error", "error": str(e)}
+            failed += len(chunk)
+            if ordered:
+                break
+            continue
+        await select_cache.bump(collection)
+        for key, field in (
+            ("inserted", "nInserted"),
+            ("matched", "nMatched"),
+            ("modified", "nModified"),
+            ("deleted", "nRemoved"),
+            ("upserted", "nUpserted"),
+        ):
+            counts[key] += details.get(field, 0)
+        errors = {error["index"]: error for error in details.get("writeErrors", [])}
+        upserted = {item["index"]: item["_id"] for item in details.get("upserted", [])}
+        # An ordered write stops at its first error
+        executed = min(errors) if ordered and errors else len(chunk)
+        for index in range(len(chunk)):
+            if index in errors:
+                failed += 1
+                results[offset + index] = {
+                    "status": "error",
+                    "error": errors[index].get("errmsg", "Write error"),
+                    "code": errors[index].get("code"),
+                }
+            elif index < executed:
+                result = {"status": "ok"}
+                if index in inserted_ids:
+                    result["inserted_id"] = str(inserted_ids[index])
+                elif index in upserted:
+                    result["upserted_id"] = str(upserted[index])
+                results[offset + index] = result
+        if ordered and errors:
+            break
+    return {"status": "success", **counts, "failed": failed, "results": results}
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from prometheus_client import Counter, Gauge
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    SELECT_CACHE_TTL,
+    SELECT_CACHE_MAX_BYTES,
+    SELECT_CACHE_MAX_ENTRY_BYTES,
+    SELECT_COALESCE_MAX_KEYS,
+)
+from singleflight import SingleFlight
+
+logger = logging.getLogger("cache")
+
+SELECT_CACHE_REQUESTS = Counter(
+    "envybase_select_cache_requests_total",
+    "Lookups of the /select result cache, by tier (local or redis) and result (hit, miss or error).",
+    ["tier", "result"],
+)
+SELECT_CACHE_BYTES = Gauge(
+    "envybase_select_cache_bytes",
+    "Size of the /select responses cached in process memory.",
+    multiprocess_mode="livesum",
+)
+SELECT_CACHE_ENTRIES = Gauge(
+    "envybase_select_cache_entries",
+    "Number of /select responses cached in process memory.",
+    multiprocess_mode="livesum",
+)
+
+
+def namespace(collection) -> str:
+    """The full name of a Motor collection, e.g. 'envybase.database'."""
+    return f"{collection.database.name}.{collection.name}"
+
+
+def request_digest(**request) -> str:
+    """
+    Hashes the parameters of a /select request, equal for equivalent requests.
+
+    Top-level query fields are ANDed together, so their order does not change the
+    result and they are sorted. Nested values keep their order, MongoDB compares
+    embedded documents field by field.
+    """
+    request["query"] = dict(sorted(request.get("query", {}).items()))
+    canonical = json.dumps(request, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def cache_key(collection, version: int, digest: str) -> str:
+    """Builds the cache key of a /select request on a collection at a write version."""
+    return f"select:{namespace(collection)}:{version}:{digest}"
+
+
+def flight_key(collection, version: Optional[int], digest: str) -> str:
+    """
+    Builds the single-flight key of a /select request on a collection, at a write
+    version when the result is to be cached.
+
+    The version keeps a read that started before a write, possibly made by another
+    process, from being shared with requests that already saw the write and would
+    cache its result under the new version.
+    """
+    if version is None:
+        return f"{namespace(collection)}:{digest}"
+    return f"{namespace(collection)}:{version}:{digest}"
+
+
+class SelectCache:
+    """
+    Cache of serialized /select responses: a least recently used cache in process
+    memory in front of Redis, shared by every process using the same Redis.
+
+    Each collection has a write version, bumped after every write to it and part of
+    the cache keys, so responses cached before a write are never served after it.
+    Versions live in Redis, or in process memory without Redis, in which case the
+    cache only works for a single server process (another one would not see the
+    writes). Writes made outside of this service are not seen, entries expire after
+    SELECT_CACHE_TTL seconds to bound how stale they can get. When Redis fails the
+    cache is bypassed.
+    """
+
+    def __init__(
+        self,
+        redis: Optional[Redis],
+        ttl: int,
+        max_bytes: int,
+        flights: Optional[SingleFlight] = None,
+    ):
+        """
+        Args:
+            redis: An asyncio Redis client, or None for a process-local cache only.
+            ttl: Seconds a response stays cached.
+            max_bytes: Memory the process-local tier may use for responses.
+            flights: Coalesced reads of the same collections, restarted after writes.
+        """
+        self.redis = redis
+        self.flights = flights
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = redis is not None or int(os.getenv("WEB_CONCURRENCY", 1)) == 1
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._versions = {}
+
+    async def version(self, collection) -> Optional[int]:
+        """Returns the write version of a collection, None if it is unavailable."""
+        if not self.enabled:
+            return None
+        if self.redis is None:
+            return self._versions.get(namespace(collection), 0)
+        try:
+            return int(
+                await self.redis.get(f"select:version:{namespace(collection)}") or 0
+            )
+        except (RedisError, OSError) as e:
+            SELECT_CACHE_REQUESTS.labels("redis", "error").inc()
+            logger.warning("Select cache unavailable, bypassing: %s", e)
+            return None
+
+    async def bump(self, collection):
+        """Invalidates the cached responses of a collection, after a write to it."""
+        name = namespace(collection)
+        if self.flights is not None:
+            # Reads in flight may have started before the write. Only saves the
+            # requests of this process from waiting on them: other processes do not
+            # see it, cached results stay correct through the version in flight_key
+            self.flights.forget(f"{name}:")
+        if not self.enabled:
+            return
+        if self.redis is None:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return
+        try:
+            await self.redis.incr(f"select:version:{name}")
+        except (RedisError, OSError) as e:
+            # Responses cached before the write are served until they expire
+            SELECT_CACHE_REQUESTS.labels("redis", "error").inc()
+            logger.warning("Could not invalidate the select cache of %s: %s", name, e)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                SELECT_CACHE_REQUESTS.labels("local", "hit").inc()
+                return entry[0]
+            del self._entries[key]
+            self._bytes -= len(entry[0])
+        SELECT_CACHE_REQUESTS.labels("local", "miss").inc()
+        if self.redis is None:
+            return None
+        try:
+            body = await self.redis.get(key)
+        except (RedisError, OSError) as e:
+            SELECT_CACHE_REQUESTS.labels("redis", "error").inc()
+            logger.warning("Select cache unavailable, bypassing: %s", e)
+            return None
+        SELECT_CACHE_REQUESTS.labels("redis", "hit" if body else "miss").inc()
+        if body:
+            self._store(key, body)
+        return body
+
+    async def set(self, key: str, body: bytes):
+        if len(body) > SELECT_CACHE_MAX_ENTRY_BYTES:
+            return
+        self._store(key, body)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, body, ex=self.ttl)
+            except (RedisError, OSError) as e:
+                SELECT_CACHE_REQUESTS.labels("redis", "error").inc()
+                logger.warning("Could not store in the select cache: %s", e)
+
+    def _store(self, key: str, body: bytes):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous[0])
+        self._entries[key] = (body, time.monotonic() + self.ttl)
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)[1]
+            self._bytes -= len(evicted)
+        SELECT_CACHE_BYTES.set(self._bytes)
+        SELECT_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        SELECT_CACHE_BYTES.set(0)
+        SELECT_CACHE_ENTRIES.set(0)
+
+    async def close(self):
+        self.clear()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+select_flights = SingleFlight("select", SELECT_COALESCE_MAX_KEYS)
+select_cache = SelectCache(
+    Redis(
+        host=REDIS_HOST,
+        port=int(REDIS_PORT),
+        # A slow cache must not make /select slower than MongoDB
+        socket_timeout=0.25,
+        socket_connect_timeout=0.25,
+    )
+    if REDIS_HOST
+    else None,
+    SELECT_CACHE_TTL,
+    SELECT_CACHE_MAX_BYTES,
+    select_flights,
+)
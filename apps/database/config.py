@@ -1,5 +1,6 @@
 import os
 import dotenv
+from common.server import per_worker
 
 dotenv.load_dotenv()
 # ANSI color constants
@@ -22,9 +23,81 @@ MONGO_URI = os.getenv("MONGO_URI")
 if not os.getenv("DATABASE_PORT"):
     print("\033[33m[WARN]\033[0m DATABASE_PORT not set, using default value of 3122")
 DATABASE_PORT = int(os.getenv("DATABASE_PORT", 3122))
-ISCLOUDFLARE = os.getenv("ISCLOUDFLARE", False)
+ISCLOUDFLARE = os.getenv("ISCLOUDFLARE", "False") == "True"
 DOCKER = os.getenv("DOCKER", False)
 if DOCKER == "True":
     host = "127.0.0.1"  # Internal only because it's going to be in a Docker network
 else:
     host = "0.0.0.0"
+
+# Request log buffering (see common/logbuffer.py)
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", 10000))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 500))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 1.0))
+# Seconds to wait for room when the buffer is full, 0 drops the log instead
+LOG_BLOCK_TIMEOUT = float(os.getenv("LOG_BLOCK_TIMEOUT", 0))
+# Days before log entries expire, 0 keeps them forever
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", 30))
+
+# MongoDB connections of a service instance, split between its server processes
+MONGO_POOL_SIZE = per_worker(int(os.getenv("MONGO_POOL_SIZE", 50)), minimum=5)
+
+# Access tokens are verified locally against the auth service's public keys when
+# JWKS_URL is set, e.g. http://auth:3121/.well-known/jwks.json. Otherwise requests
+# are trusted to have been authenticated by nginx (auth_request).
+JWKS_URL = os.getenv("JWKS_URL")
+# Expected 'iss' claim of the tokens, the ISSUER of the auth service
+JWT_ISSUER = os.getenv("JWT_ISSUER")
+
+# Largest page /select returns, whatever limit the client asks for
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# Server-side time limit of a single query, in milliseconds
+QUERY_MAX_TIME_MS = int(os.getenv("QUERY_MAX_TIME_MS", 5000))
+# Documents read from MongoDB and written to the client at a time when streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))
+# Documents or operations sent to MongoDB per insert_many / bulk_write call
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+# Most documents or operations a JSON body may hold, NDJSON uploads are unbounded
+BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", 10000))
+# Most indexes the documents collection may have, '_id' included (MongoDB allows 64)
+MAX_INDEXES = int(os.getenv("MAX_INDEXES", 20))
+# Index builds running at once across every process of the service, see indexes.py
+INDEX_BUILD_CONCURRENCY = int(os.getenv("INDEX_BUILD_CONCURRENCY", 1))
+# Seconds a build holds its slot without renewing it, so a crashed process frees it
+INDEX_BUILD_LEASE_SECONDS = int(os.getenv("INDEX_BUILD_LEASE_SECONDS", 60))
+# MongoDB database holding the named collections, see namespaces.py
+DATA_DATABASE = os.getenv("DATA_DATABASE", "envybase_data")
+# Collection handles kept by each server process
+COLLECTION_CACHE_SIZE = int(os.getenv("COLLECTION_CACHE_SIZE", 1000))
+# Fields every named collection gets an ascending index on, comma-separated
+# (e.g. 'json.created_at,json.owner'), created the first time it is used
+COLLECTION_INDEXES = [
+    field.strip()
+    for field in os.getenv("COLLECTION_INDEXES", "").split(",")
+    if field.strip()
+]
+
+# Redis of the /select result cache (see cache.py), optional. Without it, responses
+# are only cached in process memory, and only with a single server process.
+REDIS_HOST = os.getenv("REDIS_HOST")
+REDIS_PORT = os.getenv("REDIS_PORT", 6379)
+# Seconds a /select response stays cached, bounding how stale it can get after
+# writes made outside of this service
+SELECT_CACHE_TTL = int(os.getenv("SELECT_CACHE_TTL", 30))
+# Memory each server process may use for cached responses, and the largest one
+SELECT_CACHE_MAX_BYTES = int(os.getenv("SELECT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SELECT_CACHE_MAX_ENTRY_BYTES = int(
+    os.getenv("SELECT_CACHE_MAX_ENTRY_BYTES", 1024 * 1024)
+)
+# Identical /select pages requested at the same time are read from MongoDB once per
+# server process and shared (see singleflight.py), for at most this many distinct
+# queries in flight
+SELECT_COALESCE = os.getenv("SELECT_COALESCE", "True") == "True"
+SELECT_COALESCE_MAX_KEYS = int(os.getenv("SELECT_COALESCE_MAX_KEYS", 1000))
+# /aggregate limits: server-side time limit in milliseconds, most documents
+# returned, whether pipelines may spill to disk when clients ask for it (large
+# sorts and groups then use disk instead of failing), and most stages
+AGGREGATE_MAX_TIME_MS = int(os.getenv("AGGREGATE_MAX_TIME_MS", 15000))
+AGGREGATE_MAX_RESULTS = int(os.getenv("AGGREGATE_MAX_RESULTS", 10000))
+AGGREGATE_ALLOW_DISK_USE = os.getenv("AGGREGATE_ALLOW_DISK_USE", "False") == "True"
+AGGREGATE_MAX_STAGES = int(os.getenv("AGGREGATE_MAX_STAGES", 30))
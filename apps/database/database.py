@@ -1,12 +1,26 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
-from config import MONGO_URI
+from config import (
+    MONGO_URI,
+    MONGO_POOL_SIZE,
+    DATA_DATABASE,
+    LOG_BUFFER_SIZE,
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL,
+    LOG_BLOCK_TIMEOUT,
+    LOG_RETENTION_DAYS,
+)
+from common.logbuffer import LogBuffer
+from common.logcollection import ensure_logs_collection
+from common.metrics import PoolMetricsListener
 
 # Async database references
 client = None
 db = None
 users = None
 database_db = None
+data_db = None
+index_builds = None
 logs = None
 realtime = None
 
@@ -20,14 +34,15 @@ async def init_db():
     by issuing a ping command. Returns True if initialization succeeds. Raises an exception
     if the connection to MongoDB (or Redis, if enabled) fails.
     """
-    global client, db, database_db, logs, realtime
+    global client, db, database_db, data_db, index_builds, logs, realtime
     try:
         client = AsyncIOMotorClient(
             MONGO_URI,
-            maxPoolSize=50,
+            maxPoolSize=MONGO_POOL_SIZE,
             connectTimeoutMS=5000,
             serverSelectionTimeoutMS=5000,
             waitQueueTimeoutMS=5000,
+            event_listeners=[PoolMetricsListener("database")],
         )
 
         # Verify MongoDB connection
@@ -41,13 +56,71 @@ async def init_db():
         DB_NAME = "envybase"
         db = client[DB_NAME]
         database_db = db["database"]
+        data_db = client[DATA_DATABASE]
+        index_builds = db["index_builds"]
         logs = db["logs"]
+        await ensure_logs_collection(db, LOG_RETENTION_DAYS * 86400)
 
         return True
     except ConnectionFailure as e:
         raise Exception(f"Failed to connect to MongoDB or Redis: {str(e)}") from e
 
 
+def get_database_db():
+    """
+    Returns the documents collection, raising if the database has not been initialized.
+    """
+    if database_db is None:
+        raise RuntimeError(
+            "Database collection is not initialized. Did you call init_db()?"
+        )
+    return database_db
+
+
+def get_data_db():
+    """
+    Returns the database of the named collections, raising if the database has not
+    been initialized.
+    """
+    if data_db is None:
+        raise RuntimeError("Data database is not initialized. Did you call init_db()?")
+    return data_db
+
+
+def get_index_builds():
+    """
+    Returns the collection of index build leases, raising if the database has not
+    been initialized.
+    """
+    if index_builds is None:
+        raise RuntimeError(
+            "Index builds collection is not initialized. Did you call init_db()?"
+        )
+    return index_builds
+
+
+def get_logs():
+    """
+    Returns the logs collection, raising if the database has not been initialized.
+    """
+    if logs is None:
+        raise RuntimeError(
+            "Logs collection is not initialized. Did you call init_db()?"
+        )
+    return logs
+
+
+# Request logs are batched in memory and written with insert_many,
+# started and drained by the application lifespan
+log_buffer = LogBuffer(
+    get_logs,
+    max_size=LOG_BUFFER_SIZE,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+    block_timeout=LOG_BLOCK_TIMEOUT,
+)
+
+
 async def close_db_connection():
     """
     Closes the MongoDB and Redis connections if they are open.
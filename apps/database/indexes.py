@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from bson import SON, ObjectId, json_util
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+from config import (
+    INDEX_BUILD_CONCURRENCY,
+    INDEX_BUILD_LEASE_SECONDS,
+    MAX_INDEXES,
+    QUERY_MAX_TIME_MS,
+)
+from database import get_index_builds
+from models import Explain, IndexCreate
+
+logger = logging.getLogger("indexes")
+
+# MongoDB error codes of index operations
+INDEX_NOT_FOUND = 27
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+
+def _to_json(value):
+    """Converts BSON values (ObjectId, Timestamp...) to their extended JSON form."""
+    return json.loads(json_util.dumps(value))
+
+
+def _describe(index: dict) -> dict:
+    return {
+        "name": index["name"],
+        "keys": _to_json(index["key"]),
+        "unique": index.get("unique", index["name"] == "_id_"),
+        "partial_filter": _to_json(index.get("partialFilterExpression")),
+        "expire_after_seconds": index.get("expireAfterSeconds"),
+    }
+
+
+def _lease_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=INDEX_BUILD_LEASE_SECONDS)
+
+
+async def _renew_lease(slot: str, owner: str):
+    while True:
+        await asyncio.sleep(INDEX_BUILD_LEASE_SECONDS / 3)
+        try:
+            await get_index_builds().update_one(
+                {"_id": slot, "owner": owner}, {"$set": {"expires_at": _lease_expiry()}}
+            )
+        except PyMongoError as e:
+            # Retried on the next round, the lease outlives two missed renewals
+            logger.warning("Could not renew the index build lease %s: %s", slot, e)
+
+
+@asynccontextmanager
+async def build_slot():
+    """
+    Holds one of the INDEX_BUILD_CONCURRENCY index build slots while the block runs.
+
+    Slots are leases in MongoDB, so the limit holds across every process of the
+    service. A lease is renewed while its build runs and expires
+    INDEX_BUILD_LEASE_SECONDS after its process stops renewing it, e.g. on a crash.
+
+    Raises:
+        HTTPException: If every slot is taken. (429)
+    """
+    leases = get_index_builds()
+    owner = str(ObjectId())
+    for number in range(INDEX_BUILD_CONCURRENCY):
+        slot = f"slot-{number}"
+        try:
+            # Takes the slot if it is free or its lease expired, a slot held by
+            # another build makes the upsert collide with it
+            await leases.update_one(
+                {"_id": slot, "expires_at": {"$lt": datetime.now(timezone.utc)}},
+                {"$set": {"owner": owner, "expires_at": _lease_expiry()}},
+                upsert=True,
+            )
+            break
+        except DuplicateKeyError:
+            continue
+    else:
+        raise HTTPException(
+            status_code=429, detail="Too many index builds running, retry later"
+        )
+    renewal = asyncio.create_task(_renew_lease(slot, owner))
+    try:
+        yield
+    finally:
+        renewal.cancel()
+        await leases.delete_one({"_id": slot, "owner": owner})
+
+
+async def list_indexes(collection) -> list:
+    """Returns the indexes of a collection, '_id_' first."""
+    cursor = collection.list_indexes()
+    return [_describe(index) async for index in cursor]
+
+
+async def create_index(collection, data: IndexCreate) -> dict:
+    """
+    Builds an index on a collection.
+
+    At most INDEX_BUILD_CONCURRENCY builds run at once across the service, as a
+    build reads the whole collection (see ``build_slot``), and a collection keeps
+    at most MAX_INDEXES indexes, as each one slows down every write.
+
+    Raises:
+        HTTPException: If MAX_INDEXES is reached or the index is invalid (400), an
+            index with the same name or keys but other options exists, or existing
+            documents break a unique index (409), or too many builds are running (429).
+    """
+    async with build_slot():
+        indexes = await list_indexes(collection)
+        if len(indexes) >= MAX_INDEXES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"The collection already has {len(indexes)} indexes, the maximum",
+            )
+        options = {"unique": data.unique}
+        if data.name:
+            options["name"] = data.name
+        if data.partial_filter is not None:
+            options["partialFilterExpression"] = data.partial_filter
+        if data.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = data.expire_after_seconds
+        try:
+            name = await collection.create_index(list(data.keys.items()), **options)
+        except DuplicateKeyError as e:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Existing documents violate the unique index: {e}",
+            )
+        except OperationFailure as e:
+            if e.code in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+                raise HTTPException(status_code=409, detail=str(e))
+            raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "name": name}
+
+
+async def drop_index(collection, name: str):
+    """
+    Drops an index of a collection.
+
+    Raises:
+        HTTPException: If the index is '_id_' (400) or does not exist (404).
+    """
+    if name == "_id_":
+        raise HTTPException(
+            status_code=400, detail="The '_id_' index cannot be dropped"
+        )
+    try:
+        await collection.drop_index(name)
+    except OperationFailure as e:
+        if e.code == INDEX_NOT_FOUND or "index not found" in str(e):
+            raise HTTPException(status_code=404, detail="No index with this name")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _plan_stages(plan: dict) -> list:
+    """Lists the stages of a query plan, from the first to run to the last."""
+    stages = []
+    while plan:
+        stages.insert(0, {"stage": plan.get("stage"), "index": plan.get("indexName")})
+        children = plan.get("inputStages") or [plan.get("inputStage")]
+        # Plans combining several inputs ($or) are listed along their first one
+        plan = children[0]
+    return stages
+
+
+async def explain(collection, data: Explain) -> dict:
+    """
+    Explains a find on a collection, within QUERY_MAX_TIME_MS.
+
+    Returns:
+        A summary (stages of the winning plan, whether it scans the collection and,
+        unless only planned, the documents and keys examined) and the raw output of
+        MongoDB's explain.
+
+    Raises:
+        HTTPException: If the query is invalid or takes too long. (400)
+    """
+    find = SON([("find", collection.name), ("filter", data.query)])
+    if data.sort:
+        find["sort"] = SON(data.sort.items())
+    if data.limit:
+        find["limit"] = data.limit
+    find["maxTimeMS"] = QUERY_MAX_TIME_MS
+    try:
+        result = await collection.database.command(
+            "explain", find, verbosity=data.verbosity
+        )
+    except OperationFailure as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    winning = result.get("queryPlanner", {}).get("winningPlan", {})
+    # The slot based engine (MongoDB 5+) nests the classic plan under 'queryPlan'
+    stages = _plan_stages(winning.get("queryPlan", winning))
+    summary = {
+        "stages": stages,
+        "collection_scan": any(stage["stage"] == "COLLSCAN" for stage in stages),
+    }
+    stats = result.get("executionStats")
+    if stats:
+        summary.update(
+            returned=stats.get("nReturned"),
+            docs_examined=stats.get("totalDocsExamined"),
+            keys_examined=stats.get("totalKeysExamined"),
+            milliseconds=stats.get("executionTimeMillis"),
+        )
+    return {"status": "success", "summary": summary, "explain": _to_json(result)}
@@ -1,22 +1,73 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from fastapi.responses import Response, StreamingResponse
 from contextlib import asynccontextmanager
-import uvicorn
-from config import DATABASE_PORT, host
-from database import database_db, logs, init_db, close_db_connection
-from models import Document, Query, Update, Delete
-import pytz
-import datetime
+import functools
+import json
+import logging
+from config import (
+    DATABASE_PORT,
+    ISCLOUDFLARE,
+    host,
+    JWKS_URL,
+    JWT_ISSUER,
+    MAX_PAGE_SIZE,
+    BULK_BATCH_SIZE,
+    QUERY_MAX_TIME_MS,
+    SELECT_COALESCE,
+    AGGREGATE_ALLOW_DISK_USE,
+    AGGREGATE_MAX_TIME_MS,
+    STREAM_BATCH_SIZE,
+)
+from database import log_buffer, init_db, close_db_connection
+from namespaces import collection_cache, collection_dependency
+from cache import (
+    cache_key,
+    flight_key,
+    request_digest,
+    select_cache,
+    select_flights,
+)
+from paging import (
+    sort_spec,
+    page_projection,
+    encode_cursor,
+    cursor_filter,
+    remove_path,
+)
+from streaming import json_default, stream_documents
+from bulk import InsertReport, bulk_write, new_document
+import indexes
+from aggregation import check_pipeline, result_cap, run_pipeline
+from models import (
+    Aggregate,
+    BulkWrite,
+    Document,
+    Explain,
+    IndexCreate,
+    InsertMany,
+    Query,
+    Update,
+    Delete,
+)
 import random
-from decorator import loggers_route  # type: ignore
+from common.middleware import RequestLogMiddleware
+from common.metrics import EventLoopMonitor, metrics_response
+from common.server import serve
+from common.logcollection import log_entry
+from common.ndjson import NDJSON_MEDIA_TYPE, is_ndjson, read_lines
+from common.jwt_verifier import JWKSVerifier, token_dependency
 
+# Configure logging
+logging.basicConfig(level=logging.INFO)
 
-def get_utc_now():
-    """
-    Returns the current UTC time as a formatted string.
-
-    The returned string is in the format "YYYY-MM-DD HH:MM:SS".
-    """
-    return datetime.datetime.now(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
+loop_monitor = EventLoopMonitor("database")
+# Verifies access tokens in-process against the auth JWKS, see config.JWKS_URL
+token_verifier = JWKSVerifier(JWKS_URL, issuer=JWT_ISSUER) if JWKS_URL else None
+require_token = token_dependency(token_verifier)
+get_collection = collection_dependency(require_token)
 
 
 @asynccontextmanager
@@ -27,8 +78,16 @@ async def lifespan(app: FastAPI):
     Initializes the database connection on application startup and closes it on shutdown.
     """
     await init_db()
+    log_buffer.start()
+    loop_monitor.start()
     yield
+    await loop_monitor.stop()
+    await log_buffer.stop()
     await close_db_connection()
+    collection_cache.clear()
+    await select_cache.close()
+    if token_verifier is not None:
+        await token_verifier.close()
 
 
 app = FastAPI(
@@ -37,10 +96,15 @@ app = FastAPI(
     version="0",
     lifespan=lifespan,
 )
+app.add_middleware(
+    RequestLogMiddleware,
+    service="database",
+    log_buffer=log_buffer,
+    trust_cloudflare=ISCLOUDFLARE,
+)
 
 
 @app.get("/", summary="Health check")
-@loggers_route()
 async def read_root(request: Request):
     """
     Returns the health status of the database service.
@@ -53,9 +117,20 @@ async def read_root(request: Request):
     return {"status": "healthy", "service": "database"}
 
 
-@app.post("/insert", summary="Insert a new document into the database")
-@loggers_route()
-async def insert(data: Document, request: Request):
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Exposes the service metrics in the Prometheus text format.
+    """
+    return metrics_response()
+
+
+@app.post(
+    "/insert",
+    summary="Insert a new document into the database",
+    dependencies=[Depends(require_token)],
+)
+async def insert(data: Document, request: Request, collection=Depends(get_collection)):
     """
     Inserts a document into the database.
 
@@ -63,71 +138,292 @@ async def insert(data: Document, request: Request):
     """
     try:
         db_insert = data.model_dump()
-        await database_db.insert_one(db_insert)
+        await collection.insert_one(db_insert)
+        await select_cache.bump(collection)
         return {"status": "success", "message": "Document inserted successfully"}
     except Exception as e:
         error_id = random.randint(100000, 9999999999999)
-        await logs.insert_one(
-            {
-                "name": data.name,
-                "error": str(e),
-                "created_at": get_utc_now(),
-                "status": "error",
-                "error_id": error_id,
-                "type": "insert_error",
-            }
+        await log_buffer.put(
+            log_entry(
+                "database",
+                "/insert",
+                name=getattr(data, "name", "N/A"),
+                error=str(e),
+                status="error",
+                error_id=error_id,
+                type="insert_error",
+            )
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Error during database insertion: {str(e)}"
+        )
+
+
+async def _insert_ndjson(request: Request, report: InsertReport):
+    """Inserts an NDJSON upload BULK_BATCH_SIZE lines at a time, as it arrives."""
+    documents, positions = [], []
+    index = -1
+    async for line in read_lines(request):
+        if line is not None and not line.strip():
+            continue
+        index += 1
+        if line is None:
+            report.error(index, "Line too long")
+            continue
+        try:
+            documents.append(new_document(Document.model_validate_json(line)))
+            positions.append(index)
+        except ValueError as e:
+            report.error(index, str(e))
+            continue
+        if len(documents) >= BULK_BATCH_SIZE:
+            await report.insert(documents, positions)
+            documents, positions = [], []
+    if documents:
+        await report.insert(documents, positions)
+
+
+@app.post(
+    "/insert_many",
+    summary="Insert many documents into the database",
+    dependencies=[Depends(require_token)],
+)
+async def insert_many(request: Request, collection=Depends(get_collection)):
+    """
+    Inserts documents in unordered batches of BULK_BATCH_SIZE, so a rejected
+    document does not stop the others.
+
+    The body is either an InsertMany object, or with an 'application/x-ndjson'
+    Content-Type one document per line, read and inserted as it arrives (so uploads
+    are not limited to BULK_MAX_OPERATIONS documents).
+
+    Returns:
+        The number of inserted and failed documents, the errors by position in the
+        request and, for a JSON body, the '_id' of each document (null if it failed).
+
+    Raises:
+        RequestValidationError: If a JSON body is not a valid InsertMany. (422)
+    """
+    try:
+        if is_ndjson(request.headers.get("content-type")):
+            report = InsertReport(collection, with_ids=False)
+            await _insert_ndjson(request, report)
+            return report.as_dict()
+        try:
+            data = InsertMany.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        report = InsertReport(collection)
+        for offset in range(0, len(data.documents), BULK_BATCH_SIZE):
+            chunk = data.documents[offset : offset + BULK_BATCH_SIZE]
+            await report.insert(
+                [new_document(document) for document in chunk],
+                list(range(offset, offset + len(chunk))),
+            )
+        return report.as_dict()
+    except RequestValidationError:
+        raise
+    except Exception as e:
+        error_id = random.randint(100000, 9999999999999)
+        await log_buffer.put(
+            log_entry(
+                "database",
+                "/insert_many",
+                error=str(e),
+                status="error",
+                error_id=error_id,
+                type="insert_many_error",
+            )
         )
         raise HTTPException(
             status_code=500, detail=f"Error during database insertion: {str(e)}"
         )
 
 
-@app.post("/select", summary="Select a document from the database")
-@loggers_route()
-async def select(data: Query, request: Request):
+@app.post(
+    "/bulk",
+    summary="Apply insert, update and delete operations in bulk",
+    dependencies=[Depends(require_token)],
+)
+async def bulk(data: BulkWrite, request: Request, collection=Depends(get_collection)):
+    """
+    Applies mixed insert, update and delete operations with bulk_write.
+
+    Returns:
+        Aggregate counts (inserted, matched, modified, deleted, upserted, failed) and
+        the result of each operation, see ``bulk.bulk_write``.
+
+    Raises:
+        HTTPException: If an unexpected error occurs. (500)
+    """
+    try:
+        return await bulk_write(collection, data.operations, data.ordered)
+    except Exception as e:
+        error_id = random.randint(100000, 9999999999999)
+        await log_buffer.put(
+            log_entry(
+                "database",
+                "/bulk",
+                operations=len(data.operations),
+                error=str(e),
+                status="error",
+                error_id=error_id,
+                type="bulk_error",
+            )
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Error during bulk write: {str(e)}"
+        )
+
+
+async def _read_page(
+    collection, query: dict, projection, spec: list, limit: int, hidden: list
+) -> bytes:
+    """Reads a page of /select, returned serialized so it can be shared as is."""
+    # One extra document tells whether there is a next page
+    cursor = (
+        collection.find(query, projection)
+        .sort(spec)
+        .limit(limit + 1)
+        .max_time_ms(QUERY_MAX_TIME_MS)
+    )
+    result_list = await cursor.to_list(length=limit + 1)
+    next_cursor = None
+    if len(result_list) > limit:
+        result_list.pop()
+        next_cursor = encode_cursor(result_list[-1], spec)
+    for doc in result_list:
+        for path in hidden:
+            remove_path(doc, path)
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+    page = {"status": "success", "data": result_list, "next_cursor": next_cursor}
+    return json.dumps(page, separators=(",", ":"), default=json_default).encode()
+
+
+@app.post(
+    "/select",
+    summary="Select a document from the database",
+    dependencies=[Depends(require_token)],
+)
+async def select(data: Query, request: Request, collection=Depends(get_collection)):
     """
-    Retrieves documents from the database matching the provided query.
+    Retrieves one page of documents matching the provided query.
+
+    Pages hold at most ``limit`` documents, capped at MAX_PAGE_SIZE (also the size
+    used when ``limit`` is 0), and are ordered by ``sort`` then '_id'. When more
+    documents match, ``next_cursor`` is returned; sending it back with the same
+    query and sort fetches the next page. Pages resume after the last document seen
+    instead of skipping over the previous ones, so every page costs the same however
+    deep the client pages, given an index on the sort field and '_id'.
+
+    The sort field should hold values of a single type: range comparisons in
+    MongoDB only match values of the same type, so documents with another type are
+    skipped when paging (missing and null values are handled).
+
+    With 'Accept: application/x-ndjson', all matching documents (up to ``limit``
+    when set) are streamed instead, one JSON document per line, read and written
+    ``batch_size`` at a time (default STREAM_BATCH_SIZE). Memory use then does not
+    grow with the result, and the first documents arrive before the query is done.
+
+    Identical pages requested at the same time are read once and shared, unless
+    SELECT_COALESCE is off, so a burst of clients loading the same page costs one
+    query.
+
+    With ``cache`` set, pages are served from the result cache when possible (see
+    cache.SelectCache), with an 'X-Cache: hit' or 'miss' header. Every write made
+    through this service invalidates the cached pages of its collection.
 
     Args:
-        data: Contains the query dictionary used to filter documents.
+        data: The query filter, page size, projection, sort and cursor.
 
     Returns:
-        A dictionary with a success status and a list of matching documents. Each document's `_id` field is converted to a string.
+        A dictionary with a success status, the list of documents (each `_id` converted to a string) and the cursor of the next page, or None on the last page.
 
     Raises:
-        HTTPException: If an error occurs during the database operation, returns a 500 error with details.
+        HTTPException: If the cursor is invalid (400) or an error occurs during the database operation (500).
     """
     query = data.query
+    limit = min(data.limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+    spec = sort_spec(data.sort)
+    projection, hidden = page_projection(data.projection, spec)
     try:
-        cursor = database_db.find(query)
-        result_list = []
-        async for doc in cursor:
-            if "_id" in doc:
-                doc["_id"] = str(doc["_id"])
-            result_list.append(doc)
-        return {"status": "success", "data": result_list}
+        page_query = query
+        if data.cursor:
+            page_query = {"$and": [query, cursor_filter(data.cursor, spec)]}
+        if is_ndjson(request.headers.get("accept")):
+            batch_size = data.batch_size or STREAM_BATCH_SIZE
+            # No time limit, a stream may legitimately take long to read
+            cursor = (
+                collection.find(page_query, projection)
+                .sort(spec)
+                .limit(data.limit)
+                .batch_size(batch_size)
+            )
+            return StreamingResponse(
+                stream_documents(cursor, request, "/select", hidden, batch_size),
+                media_type=NDJSON_MEDIA_TYPE,
+            )
+        digest = request_digest(
+            query=query,
+            projection=data.projection,
+            sort=data.sort,
+            limit=limit,
+            cursor=data.cursor,
+        )
+        key = None
+        version = None
+        headers = {}
+        if data.cache:
+            version = await select_cache.version(collection)
+            if version is not None:
+                key = cache_key(collection, version, digest)
+                body = await select_cache.get(key)
+                if body is not None:
+                    return Response(
+                        body, media_type="application/json", headers={"X-Cache": "hit"}
+                    )
+        read = functools.partial(
+            _read_page, collection, page_query, projection, spec, limit, hidden
+        )
+        if SELECT_COALESCE:
+            body = await select_flights.do(
+                flight_key(collection, version, digest), read
+            )
+        else:
+            body = await read()
+        if key is not None:
+            await select_cache.set(key, body)
+            headers["X-Cache"] = "miss"
+        return Response(body, media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         error_id = random.randint(100000, 9999999999999)
         log_name = getattr(data, "name", "N/A")
-        await logs.insert_one(
-            {
-                "name": log_name,
-                "query_attempted": query,
-                "error": str(e),
-                "created_at": get_utc_now(),
-                "status": "error",
-                "error_id": error_id,
-                "type": "select_error",
-            }
+        await log_buffer.put(
+            log_entry(
+                "database",
+                "/select",
+                name=log_name,
+                query_attempted=query,
+                error=str(e),
+                status="error",
+                error_id=error_id,
+                type="select_error",
+            )
         )
         raise HTTPException(
             status_code=500, detail=f"Error during database selection: {str(e)}"
         )
 
 
-@app.post("/delete", summary="Delete a document from the database")
-@loggers_route()
-async def delete(data: Delete, request: Request):
+@app.post(
+    "/delete",
+    summary="Delete a document from the database",
+    dependencies=[Depends(require_token)],
+)
+async def delete(data: Delete, request: Request, collection=Depends(get_collection)):
     """
     Deletes a document from the database matching the provided query.
 
@@ -139,32 +435,39 @@ async def delete(data: Delete, request: Request):
     """
     query = data.query
     try:
-        result = await database_db.delete_one(query)
+        result = await collection.delete_one(query)
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="No document found to delete")
+        await select_cache.bump(collection)
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         error_id = random.randint(100000, 9999999999999)
         log_name = getattr(data, "name", "N/A")
-        await logs.insert_one(
-            {
-                "name": log_name,
-                "query_attempted": query,
-                "error": str(e),
-                "created_at": get_utc_now(),
-                "status": "error",
-                "error_id": error_id,
-                "type": "delete_error",
-            }
+        await log_buffer.put(
+            log_entry(
+                "database",
+                "/delete",
+                name=log_name,
+                query_attempted=query,
+                error=str(e),
+                status="error",
+                error_id=error_id,
+                type="delete_error",
+            )
         )
         raise HTTPException(
             status_code=500, detail=f"Error during database deletion: {str(e)}"
         )
 
 
-@app.post("/update", summary="Update a document from the database")
-@loggers_route()
-async def update(data: Update, request: Request):
+@app.post(
+    "/update",
+    summary="Update a document from the database",
+    dependencies=[Depends(require_token)],
+)
+async def update(data: Update, request: Request, collection=Depends(get_collection)):
     """
     Updates documents in the database that match the specified query.
 
@@ -182,7 +485,9 @@ async def update(data: Update, request: Request):
     query = data.query
     update_payload = data.update
     try:
-        result = await database_db.update_one(query, {"$set": update_payload})
+        result = await collection.update_one(query, {"$set": update_payload})
+        if result.modified_count or result.upserted_id is not None:
+            await select_cache.bump(collection)
         return {
             "status": "success",
             "matched_count": result.matched_count,
@@ -191,24 +496,219 @@ async def update(data: Update, request: Request):
     except Exception as e:
         error_id = random.randint(100000, 9999999999999)
         log_name = getattr(data, "name", "N/A")
-        await logs.insert_one(
-            {
-                "name": log_name,
-                "query_attempted": query,
-                "update_payload_attempted": update_payload,
-                "error": str(e),
-                "created_at": get_utc_now(),
-                "status": "error",
-                "error_id": error_id,
-                "type": "update_error",
-            }
+        await log_buffer.put(
+            log_entry(
+                "database",
+                "/update",
+                name=log_name,
+                query_attempted=query,
+                update_payload_attempted=update_payload,
+                error=str(e),
+                status="error",
+                error_id=error_id,
+                type="update_error",
+            )
         )
         raise HTTPException(
             status_code=500, detail=f"Error during database update: {str(e)}"
         )
 
 
+async def _log_index_error(path: str, e: Exception, **fields):
+    await log_buffer.put(
+        log_entry(
+            "database",
+            path,
+            error=str(e),
+            status="error",
+            error_id=random.randint(100000, 9999999999999),
+            type="index_error",
+            **fields,
+        )
+    )
+
+
+@app.get(
+    "/indexes",
+    summary="List the indexes of the database",
+    dependencies=[Depends(require_token)],
+)
+async def list_indexes(request: Request, collection=Depends(get_collection)):
+    """
+    Lists the indexes of the collection.
+
+    Returns:
+        dict: The name, keys and options of each index.
+    """
+    try:
+        return {"status": "success", "indexes": await indexes.list_indexes(collection)}
+    except Exception as e:
+        await _log_index_error("/indexes", e)
+        raise HTTPException(
+            status_code=500, detail=f"Error while listing indexes: {str(e)}"
+        )
+
+
+@app.post(
+    "/indexes",
+    summary="Create an index on the database",
+    dependencies=[Depends(require_token)],
+)
+async def create_index(
+    data: IndexCreate, request: Request, collection=Depends(get_collection)
+):
+    """
+    Creates an index (single field, compound, unique, partial or TTL) on the
+    collection, so queries on its fields do not scan it.
+
+    Document fields are stored under 'json', so the keys are paths like 'json.email'.
+
+    Returns:
+        dict: The name of the index.
+
+    Raises:
+        HTTPException: See ``indexes.create_index``, or if the build fails. (500)
+    """
+    try:
+        return await indexes.create_index(collection, data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await _log_index_error("/indexes", e, keys=data.keys)
+        raise HTTPException(
+            status_code=500, detail=f"Error while creating the index: {str(e)}"
+        )
+
+
+@app.delete(
+    "/indexes/{name}",
+    summary="Drop an index of the database",
+    dependencies=[Depends(require_token)],
+)
+async def drop_index(name: str, request: Request, collection=Depends(get_collection)):
+    """
+    Drops an index of the collection.
+
+    Raises:
+        HTTPException: See ``indexes.drop_index``, or if the drop fails. (500)
+    """
+    try:
+        await indexes.drop_index(collection, name)
+        return {"status": "success"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await _log_index_error("/indexes", e, index=name)
+        raise HTTPException(
+            status_code=500, detail=f"Error while dropping the index: {str(e)}"
+        )
+
+
+@app.post(
+    "/explain",
+    summary="Explain how a query is executed",
+    dependencies=[Depends(require_token)],
+)
+async def explain(data: Explain, request: Request, collection=Depends(get_collection)):
+    """
+    Returns MongoDB's query plan for a query, to check that it uses an index.
+
+    Raises:
+        HTTPException: See ``indexes.explain``, or if the explain fails. (500)
+    """
+    try:
+        return await indexes.explain(collection, data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await _log_index_error("/explain", e, query_attempted=data.query)
+        raise HTTPException(
+            status_code=500, detail=f"Error while explaining the query: {str(e)}"
+        )
+
+
+@app.post(
+    "/aggregate",
+    summary="Run an aggregation pipeline on the database",
+    dependencies=[Depends(require_token)],
+)
+async def aggregate(
+    data: Aggregate, request: Request, collection=Depends(get_collection)
+):
+    """
+    Runs an aggregation pipeline on the collection, so counts, groupings and top-N
+    queries are computed by MongoDB instead of the client.
+
+    Only the stages of aggregation.ALLOWED_STAGES are accepted. Pipelines run for at
+    most AGGREGATE_MAX_TIME_MS, return at most ``limit`` documents (capped at
+    AGGREGATE_MAX_RESULTS, 'truncated' telling whether more were left out) and only
+    use disk when the client asks for it and AGGREGATE_ALLOW_DISK_USE is set.
+
+    With 'Accept: application/x-ndjson', the documents are streamed instead, one per
+    line, ``batch_size`` at a time (default STREAM_BATCH_SIZE). A failure midway then
+    ends the stream early, as the status has been sent already.
+
+    Raises:
+        HTTPException: If disk use is not allowed, the pipeline uses a stage or an
+            operator that is not allowed or fails (400), it takes longer than
+            AGGREGATE_MAX_TIME_MS (504), or another error occurs (500).
+    """
+    if data.allow_disk_use and not AGGREGATE_ALLOW_DISK_USE:
+        raise HTTPException(
+            status_code=400, detail="Disk use is not allowed on this server"
+        )
+    try:
+        check_pipeline(data.pipeline)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pipeline: {e}")
+    cap = result_cap(data.limit)
+    try:
+        if is_ndjson(request.headers.get("accept")):
+            batch_size = data.batch_size or STREAM_BATCH_SIZE
+            cursor = run_pipeline(
+                collection, data.pipeline, cap, data.allow_disk_use, batch_size
+            )
+            return StreamingResponse(
+                stream_documents(cursor, request, "/aggregate", batch_size=batch_size),
+                media_type=NDJSON_MEDIA_TYPE,
+            )
+        # One extra document tells whether the result was cut
+        cursor = run_pipeline(collection, data.pipeline, cap + 1, data.allow_disk_use)
+        documents = await cursor.to_list(length=cap + 1)
+        page = {
+            "status": "success",
+            "data": documents[:cap],
+            "truncated": len(documents) > cap,
+        }
+        # Documents may hold values JSON has no type for (ObjectId, dates)
+        body = json.dumps(page, separators=(",", ":"), default=json_default).encode()
+        return Response(body, media_type="application/json")
+    except ExecutionTimeout:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Aggregation took longer than {AGGREGATE_MAX_TIME_MS} ms",
+        )
+    except OperationFailure as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pipeline: {e}")
+    except Exception as e:
+        error_id = random.randint(100000, 9999999999999)
+        await log_buffer.put(
+            log_entry(
+                "database",
+                "/aggregate",
+                pipeline_attempted=data.pipeline,
+                error=str(e),
+                status="error",
+                error_id=error_id,
+                type="aggregate_error",
+            )
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Error during aggregation: {str(e)}"
+        )
+
+
 if __name__ == "__main__":
     print("Starting Envybase Database Service...")
-    uvicorn.run(app, host=host, port=int(DATABASE_PORT))
+    serve("main:app", host, DATABASE_PORT)
     print("Stopping Envybase Database Service...")
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Dict, Any
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Dict, Any, List, Literal, Optional, Union
+from config import AGGREGATE_MAX_STAGES, BULK_MAX_OPERATIONS
 
 
 class Document(BaseModel):
@@ -16,8 +17,39 @@ class Query(BaseModel):
     query: Dict[str, Any] = Field({}, description="The query to filter documents.")
     limit: int = Field(
         0,
-        description="The maximum number of documents to return. Default is 0 (No limit).",
+        ge=0,
+        description="The maximum number of documents to return. Default is 0 (the server's maximum page size).",
     )
+    projection: Optional[Dict[str, Any]] = Field(
+        None, description="Fields to include (1) or exclude (0) from the documents."
+    )
+    sort: Optional[Dict[str, Literal[1, -1]]] = Field(
+        None,
+        description="Field to sort on, ascending (1) or descending (-1). Ties are broken by '_id'.",
+    )
+    cursor: Optional[str] = Field(
+        None, description="The next_cursor of the previous page, to fetch the next one."
+    )
+    batch_size: Optional[int] = Field(
+        None,
+        ge=1,
+        le=10000,
+        description="Documents fetched per round trip when streaming (Accept: application/x-ndjson).",
+    )
+    cache: bool = Field(
+        False,
+        description="Serve the page from the result cache when it holds it, for read-heavy clients. Ignored when streaming.",
+    )
+
+    @field_validator("sort")
+    @classmethod
+    def check_sort(cls, sort):
+        if sort is not None:
+            if len(sort) > 1:
+                raise ValueError("Sorting is supported on a single field")
+            if any(field.startswith("$") for field in sort):
+                raise ValueError("Invalid sort field")
+        return sort
 
 
 class Update(BaseModel):
@@ -33,3 +65,145 @@ class Delete(BaseModel):
     """Query model for querying documents."""
 
     query: Dict[str, Any] = Field({}, description="The query to filter documents.")
+
+
+class InsertMany(BaseModel):
+    """Model for inserting many documents at once."""
+
+    documents: List[Document] = Field(
+        ...,
+        min_length=1,
+        max_length=BULK_MAX_OPERATIONS,
+        description="The documents to insert.",
+    )
+
+
+class BulkOperation(BaseModel):
+    """One operation of a bulk write: exactly one of insert, update or delete."""
+
+    insert: Optional[Document] = Field(None, description="A document to insert.")
+    update: Optional[Update] = Field(
+        None, description="Fields to set on the documents matching a query."
+    )
+    delete: Optional[Delete] = Field(
+        None, description="A query matching the documents to delete."
+    )
+    many: bool = Field(
+        False, description="Update or delete every match instead of the first."
+    )
+    upsert: bool = Field(
+        False, description="Insert a document when an update matches none."
+    )
+
+    @model_validator(mode="after")
+    def check_operation(self):
+        if sum(op is not None for op in (self.insert, self.update, self.delete)) != 1:
+            raise ValueError("Exactly one of insert, update or delete is required")
+        return self
+
+
+class BulkWrite(BaseModel):
+    """Model for mixed insert, update and delete operations applied together."""
+
+    operations: List[BulkOperation] = Field(
+        ...,
+        min_length=1,
+        max_length=BULK_MAX_OPERATIONS,
+        description="The operations, applied in order when ordered is true.",
+    )
+    ordered: bool = Field(
+        False,
+        description="Stop at the first failing operation instead of applying the rest.",
+    )
+
+
+class IndexCreate(BaseModel):
+    """Model for creating an index on the documents collection."""
+
+    keys: Dict[str, Union[Literal[1, -1], Literal["hashed", "text", "2dsphere"]]] = (
+        Field(
+            ...,
+            min_length=1,
+            max_length=32,
+            description="Fields to index, in order, ascending (1), descending (-1) or a special index type.",
+        )
+    )
+    name: Optional[str] = Field(
+        None,
+        min_length=1,
+        max_length=128,
+        description="Name of the index. Default is generated from the keys.",
+    )
+    unique: bool = Field(
+        False, description="Reject documents with the same values for the keys."
+    )
+    partial_filter: Optional[Dict[str, Any]] = Field(
+        None, description="Only index the documents matching this query."
+    )
+    expire_after_seconds: Optional[int] = Field(
+        None,
+        ge=0,
+        description="Delete documents this long after the date in the indexed field (TTL index).",
+    )
+
+    @field_validator("keys")
+    @classmethod
+    def check_keys(cls, keys):
+        if any(not field or field.startswith("$") for field in keys):
+            raise ValueError("Invalid index field")
+        return keys
+
+    @field_validator("name")
+    @classmethod
+    def check_name(cls, name):
+        if name == "_id_":
+            raise ValueError("The '_id_' index name is reserved")
+        return name
+
+    @model_validator(mode="after")
+    def check_ttl(self):
+        if self.expire_after_seconds is not None and (
+            len(self.keys) != 1 or next(iter(self.keys.values())) not in (1, -1)
+        ):
+            raise ValueError("A TTL index has a single ascending or descending key")
+        return self
+
+
+class Explain(BaseModel):
+    """Model for explaining how a query is executed."""
+
+    query: Dict[str, Any] = Field({}, description="The query to filter documents.")
+    sort: Optional[Dict[str, Literal[1, -1]]] = Field(
+        None, description="Fields to sort on, ascending (1) or descending (-1)."
+    )
+    limit: int = Field(0, ge=0, description="The maximum number of documents.")
+    verbosity: Literal["queryPlanner", "executionStats", "allPlansExecution"] = Field(
+        "queryPlanner",
+        description="'queryPlanner' only plans the query, the others also run it.",
+    )
+
+
+class Aggregate(BaseModel):
+    """Model for running an aggregation pipeline."""
+
+    pipeline: List[Dict[str, Any]] = Field(
+        ...,
+        min_length=1,
+        max_length=AGGREGATE_MAX_STAGES,
+        description="The stages of the pipeline, see aggregation.ALLOWED_STAGES.",
+    )
+    limit: int = Field(
+        0,
+        ge=0,
+        description="The maximum number of documents to return. Default is 0 (the server's maximum).",
+    )
+    allow_disk_use: bool = Field(
+        False,
+        description="Let large sorts and groups use disk, if the server allows it.",
+    )
+    batch_size: Optional[int] = Field(
+        None,
+        ge=1,
+        le=10000,
+        description="Documents fetched per round trip when streaming (Accept: application/x-ndjson).",
+    )
@@ -0,0 +1,122 @@
+import asyncio
+import re
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Query
+
+from config import COLLECTION_CACHE_SIZE, COLLECTION_INDEXES
+from database import get_data_db, get_database_db
+from common.jwt_verifier import project_of
+
+# Collection and project names: letters, digits, '_' and '-'
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Names refused for collections and projects, whatever their case: a 'system'
+# project would map to MongoDB's own 'system.*' collections
+RESERVED_NAMES = {"system"}
+
+
+class CollectionCache:
+    """
+    Least recently used Motor collection handles, with the indexes of
+    COLLECTION_INDEXES created on each collection the first time it is used.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._handles = OrderedDict()
+
+    async def get(self, name: str):
+        entry = self._handles.get(name)
+        if entry is None:
+            collection = get_data_db()[name]
+            entry = (collection, asyncio.ensure_future(_ensure_indexes(collection)))
+            self._handles[name] = entry
+            if len(self._handles) > self.max_size:
+                self._handles.popitem(last=False)
+        else:
+            self._handles.move_to_end(name)
+        collection, indexed = entry
+        try:
+            # Shared by the requests using the collection until its indexes exist
+            await asyncio.shield(indexed)
+        except Exception:
+            if self._handles.get(name) is entry:
+                del self._handles[name]
+            raise
+        return collection
+
+    def clear(self):
+        self._handles.clear()
+
+
+async def _ensure_indexes(collection):
+    for field in COLLECTION_INDEXES:
+        await collection.create_index([(field, 1)])
+
+
+collection_cache = CollectionCache(COLLECTION_CACHE_SIZE)
+
+
+def collection_name(collection: str, project: Optional[str] = None) -> str:
+    """
+    Returns the MongoDB name of a collection, prefixed with its project if any.
+
+    Raises:
+        HTTPException: If the collection or project name is invalid or reserved. (400)
+    """
+    for kind, name in (("collection", collection), ("project", project)):
+        if name is None:
+            continue
+        if not NAME_PATTERN.match(name):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid {kind} name, use up to 64 letters, digits, '_' or '-'",
+            )
+        if name.lower() in RESERVED_NAMES:
+            raise HTTPException(
+                status_code=400, detail=f"The {kind} name '{name}' is reserved"
+            )
+    return f"{project}.{collection}" if project else collection
+
+
+def collection_dependency(require_token):
+    """
+    Builds the dependency resolving the collection a request works on.
+
+    Named collections live in DATA_DATABASE, under the prefix of the caller's
+    project. When the service verifies access tokens itself, the project is derived
+    from the token subject and an X-Envy-Project header naming another project is
+    refused. Otherwise the header is trusted as set by nginx from the /verify
+    response, which replaces any value sent by the client. Without a collection,
+    requests use the shared 'envybase.database' collection, as before collections
+    existed.
+
+    Args:
+        require_token: The token dependency of the routes, resolving to the
+            verified claims, or None when the proxy authenticates requests.
+    """
+
+    async def get_collection(
+        collection: Optional[str] = Query(
+            None, description="Collection to use, the shared collection by default."
+        ),
+        x_envy_project: Optional[str] = Header(
+            None,
+            description="Project of the caller, set by the proxy from the verified token.",
+        ),
+        claims: Optional[dict] = Depends(require_token),
+    ):
+        project = x_envy_project
+        if claims is not None:
+            project = project_of(claims["sub"])
+            if x_envy_project is not None and x_envy_project != project:
+                raise HTTPException(
+                    status_code=403,
+                    detail="X-Envy-Project does not match the access token",
+                )
+        if collection is None:
+            return get_database_db()
+        return await collection_cache.get(collection_name(collection, project))
+
+    return get_collection
@@ -0,0 +1,125 @@
+import base64
+from typing import Optional
+
+import bson
+from bson.errors import BSONError
+from fastapi import HTTPException
+
+
+def sort_spec(sort: Optional[dict]) -> list:
+    """
+    Returns the sort of a page query: the requested field, then '_id' in the same
+    direction, so that every document has a unique position to resume after.
+    """
+    field, direction = next(iter(sort.items())) if sort else ("_id", 1)
+    if field == "_id":
+        return [("_id", direction)]
+    return [(field, direction), ("_id", direction)]
+
+
+def _get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def remove_path(doc: dict, path: str):
+    """Removes a dotted path from a document, and the subdocuments it leaves empty."""
+    parent, *rest = path.split(".", 1)
+    if not rest:
+        doc.pop(parent, None)
+    elif isinstance(doc.get(parent), dict):
+        remove_path(doc[parent], rest[0])
+        if not doc[parent]:
+            del doc[parent]
+
+
+def _covers(path: str, field: str) -> bool:
+    return field == path or field.startswith(path + ".")
+
+
+def page_projection(projection: Optional[dict], spec: list):
+    """
+    Extends a projection with the sort fields, which the cursor is built from.
+
+    Returns:
+        The projection to query with, and the fields added to it, to be removed from
+        the documents before they are returned.
+    """
+    if not projection:
+        return None, []
+    projection = dict(projection)
+    inclusive = any(
+        not isinstance(value, dict) and value not in (0, False)
+        for path, value in projection.items()
+        if path != "_id"
+    )
+    hidden = []
+    for field, _ in spec:
+        if field == "_id":
+            if projection.get("_id", 1) in (0, False):
+                if inclusive:
+                    projection["_id"] = 1
+                else:
+                    del projection["_id"]
+                hidden.append("_id")
+        elif inclusive:
+            if not any(
+                _covers(path, field) and value not in (0, False)
+                for path, value in projection.items()
+            ):
+                projection[field] = 1
+                hidden.append(field)
+        else:
+            for path in [p for p in projection if _covers(p, field)]:
+                del projection[path]
+                hidden.append(path)
+    # An empty projection would return the '_id' field only
+    return projection or None, hidden
+
+
+def encode_cursor(doc: dict, spec: list) -> str:
+    """
+    Encodes the position of the last document of a page as an opaque cursor.
+
+    The sort key is stored as BSON, so values keep their type (ObjectId, dates...).
+    """
+    field, direction = spec[0]
+    raw = bson.encode(
+        {"f": field, "d": direction, "v": _get_path(doc, field), "i": doc["_id"]}
+    )
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def cursor_filter(cursor: str, spec: list) -> dict:
+    """
+    Builds the filter matching the documents after a cursor, in the sort order.
+
+    Raises:
+        HTTPException: If the cursor is invalid or was made for another sort. (400)
+    """
+    try:
+        position = bson.decode(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, BSONError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if "i" not in position:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    field, direction = spec[0]
+    if position.get("f") != field or position.get("d") != direction:
+        raise HTTPException(status_code=400, detail="Cursor made for another sort")
+    after = "$gt" if direction == 1 else "$lt"
+    if field == "_id":
+        return {"_id": {after: position["i"]}}
+    value = position.get("v")
+    ties = {field: value, "_id": {after: position["i"]}}
+    # Missing and null values sort before all others, but range comparisons only
+    # match values of the same type, so they are matched separately
+    if value is None:
+        if direction == -1:
+            return ties
+        return {"$or": [{field: {"$ne": None}}, ties]}
+    if direction == -1:
+        return {"$or": [{field: {after: value}}, ties, {field: None}]}
+    return {"$or": [{field: {after: value}}, ties]}
@@ -0,0 +1,85 @@
+import asyncio
+
+from prometheus_client import Counter
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "envybase_single_flight_calls_total",
+    "Calls of single-flight groups, by group and role: 'leader' calls ran the "
+    "work, 'follower' calls shared a leader's result, 'bypass' calls ran it alone "
+    "as too many were in flight.",
+    ["group", "role"],
+)
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls within a process onto one execution.
+
+    The first call for a key (the leader) starts the work in a task, later calls for
+    the same key wait for that task instead of repeating the work, and all of them
+    get its result or exception, so results must not be modified by the callers.
+    Each caller may be cancelled (e.g. on a client disconnect) without affecting the
+    others, the work itself is cancelled when no caller waits for it anymore.
+    """
+
+    def __init__(self, name: str, max_keys: int):
+        """
+        Args:
+            name: Group name, labels its metrics.
+            max_keys: Most distinct keys in flight, beyond which calls run uncoalesced
+                so the tracking stays bounded.
+        """
+        self.name = name
+        self.max_keys = max_keys
+        self._calls = {}
+
+    async def do(self, key: str, work):
+        """
+        Returns the result of ``work()``, shared with the concurrent calls for ``key``.
+
+        Args:
+            key: Identifies the work, calls with the same key must be interchangeable.
+            work: Coroutine function starting the work.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            if len(self._calls) >= self.max_keys:
+                SINGLE_FLIGHT_CALLS.labels(self.name, "bypass").inc()
+                return await work()
+            call = self._calls[key] = _Call(asyncio.ensure_future(work()))
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+            SINGLE_FLIGHT_CALLS.labels(self.name, "leader").inc()
+        else:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "follower").inc()
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def forget(self, prefix: str):
+        """
+        Makes later calls for the keys starting with ``prefix`` start new work, e.g.
+        after a write that the work in flight may not have seen.
+        """
+        for key in [key for key in self._calls if key.startswith(prefix)]:
+            del self._calls[key]
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finished(self, key: str, call: _Call):
+        self._forget(key, call)
+        # Retrieved here too, in case every caller was cancelled before it failed
+        if not call.task.cancelled():
+            call.task.exception()
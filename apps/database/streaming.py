@@ -0,0 +1,71 @@
+import json
+import logging
+import random
+from datetime import date, datetime, time
+
+from fastapi import Request
+
+from common.logcollection import log_entry
+from database import log_buffer
+from paging import remove_path
+
+logger = logging.getLogger("streaming")
+
+
+def json_default(value):
+    """
+    Encodes the values JSON has no type for: dates and times in ISO 8601, as in
+    FastAPI's JSON responses, anything else (ObjectId...) as a string.
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+async def stream_documents(
+    cursor, request: Request, path: str, hidden=(), batch_size: int = 500
+):
+    """
+    Yields the documents of a Motor cursor as NDJSON, one document per line.
+
+    Documents are encoded as they arrive and written ``batch_size`` at a time, so
+    memory use does not depend on the number of documents. '_id' and other values
+    JSON has no type for are encoded by ``json_default``. The cursor is
+    closed when the client disconnects, and an error midway is logged and ends the
+    stream early, the status having been sent already.
+
+    Args:
+        cursor: The Motor cursor to read, its batch size set to ``batch_size``.
+        request: The request being answered, to notice client disconnects.
+        path: The route, for the error log.
+        hidden: Dotted paths to remove from each document first.
+        batch_size: Documents per chunk written to the client.
+    """
+    lines = []
+    try:
+        async for doc in cursor:
+            for field in hidden:
+                remove_path(doc, field)
+            lines.append(json.dumps(doc, default=json_default))
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+                if await request.is_disconnected():
+                    return
+        if lines:
+            yield "\n".join(lines) + "\n"
+    except Exception as e:
+        logger.warning("Stream of %s aborted: %s", path, e)
+        await log_buffer.put(
+            log_entry(
+                "database",
+                path,
+                error=str(e),
+                status="error",
+                error_id=random.randint(100000, 9999999999999),
+                type="stream_error",
+            )
+        )
+        raise
+    finally:
+        await cursor.close()
@@ -1,5 +1,6 @@
 import os
 import dotenv
+from common.server import per_worker
 
 dotenv.load_dotenv()
 # ANSI color constants
@@ -21,9 +22,28 @@ MONGO_URI = os.getenv("MONGO_URI")
 if not os.getenv("FUNC_PORT"):
     print("\033[33m[WARN]\033[0m FUNC_PORT not set, using default value of 3123")
 FUNC_PORT = int(os.getenv("FUNC_PORT", 3123))
-ISCLOUDFLARE = os.getenv("ISCLOUDFLARE", False)
+ISCLOUDFLARE = os.getenv("ISCLOUDFLARE", "False") == "True"
 DOCKER = os.getenv("DOCKER", False)
 if DOCKER == "True":
     host = "127.0.0.1"  # Internal only because it's going to be in a Docker network
 else:
     host = "0.0.0.0"
+
+# Request log buffering (see common/logbuffer.py)
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", 10000))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 500))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 1.0))
+# Seconds to wait for room when the buffer is full, 0 drops the log instead
+LOG_BLOCK_TIMEOUT = float(os.getenv("LOG_BLOCK_TIMEOUT", 0))
+# Days before log entries expire, 0 keeps them forever
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", 30))
+
+# MongoDB connections of a service instance, split between its server processes
+MONGO_POOL_SIZE = per_worker(int(os.getenv("MONGO_POOL_SIZE", 50)), minimum=5)
+
+# Access tokens are verified locally against the auth service's public keys when
+# JWKS_URL is set, e.g. http://auth:3121/.well-known/jwks.json. Otherwise requests
+# are trusted to have been authenticated by nginx (auth_request).
+JWKS_URL = os.getenv("JWKS_URL")
+# Expected 'iss' claim of the tokens, the ISSUER of the auth service
+JWT_ISSUER = os.getenv("JWT_ISSUER")
@@ -1,6 +1,17 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
-from config import MONGO_URI
+from config import (
+    MONGO_URI,
+    MONGO_POOL_SIZE,
+    LOG_BUFFER_SIZE,
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL,
+    LOG_BLOCK_TIMEOUT,
+    LOG_RETENTION_DAYS,
+)
+from common.logbuffer import LogBuffer
+from common.logcollection import ensure_logs_collection
+from common.metrics import PoolMetricsListener
 
 # Global variables to store DB connections
 client = None
@@ -26,10 +37,11 @@ async def init_db():
     try:
         client = AsyncIOMotorClient(
             MONGO_URI,
-            maxPoolSize=50,
+            maxPoolSize=MONGO_POOL_SIZE,
             connectTimeoutMS=5000,
             serverSelectionTimeoutMS=5000,
             waitQueueTimeoutMS=5000,
+            event_listeners=[PoolMetricsListener("function")],
         )
         # Check the connection by pinging the server
         await client.admin.command("ping")
@@ -38,6 +50,7 @@ async def init_db():
         db = client[DB_NAME]
         func_db = db["functions"]
         logs = db["logs"]
+        await ensure_logs_collection(db, LOG_RETENTION_DAYS * 86400)
 
         return True
     except ConnectionFailure as e:
@@ -46,6 +59,28 @@ async def init_db():
         ) from e
 
 
+def get_logs():
+    """
+    Returns the logs collection, raising if the database has not been initialized.
+    """
+    if logs is None:
+        raise RuntimeError(
+            "Logs collection is not initialized. Did you call init_db()?"
+        )
+    return logs
+
+
+# Request logs are batched in memory and written with insert_many,
+# started and drained by the application lifespan
+log_buffer = LogBuffer(
+    get_logs,
+    max_size=LOG_BUFFER_SIZE,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+    block_timeout=LOG_BLOCK_TIMEOUT,
+)
+
+
 async def close_db_connection():
     """
     Closes the MongoDB client connection if it exists.
@@ -1,23 +1,34 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
-import uvicorn
-from config import host, FUNC_PORT
-from database import logs, init_db, close_db_connection, func_db
+import logging
+from config import host, FUNC_PORT, ISCLOUDFLARE, JWKS_URL, JWT_ISSUER
+from database import log_buffer, init_db, close_db_connection, func_db
 import datetime
-from decorator import loggers_route  # type: ignore
+from common.middleware import RequestLogMiddleware
+from common.metrics import EventLoopMonitor, metrics_response
+from common.server import serve
+from common.logcollection import log_entry
+from common.jwt_verifier import JWKSVerifier, token_dependency
 from runtime import create_build_function
 from models import Function
 import pytz
 import random
 
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
 
 def utc_now():
     """
-    Returns the current UTC time as a formatted string.
-
-    The returned string is in the format "YYYY-MM-DD HH:MM:SS".
+    Returns the current UTC time as a timezone-aware datetime.
     """
-    return datetime.datetime.now(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.datetime.now(pytz.UTC)
+
+
+loop_monitor = EventLoopMonitor("function")
+# Verifies access tokens in-process against the auth JWKS, see config.JWKS_URL
+token_verifier = JWKSVerifier(JWKS_URL, issuer=JWT_ISSUER) if JWKS_URL else None
+require_token = token_dependency(token_verifier)
 
 
 @asynccontextmanager
@@ -28,8 +39,14 @@ async def lifespan(app: FastAPI):
     Initializes the database connection when the application starts and closes it upon shutdown.
     """
     await init_db()
+    log_buffer.start()
+    loop_monitor.start()
     yield
+    await loop_monitor.stop()
+    await log_buffer.stop()
     await close_db_connection()
+    if token_verifier is not None:
+        await token_verifier.close()
 
 
 app = FastAPI(
@@ -38,10 +55,15 @@ app = FastAPI(
     version="0",
     lifespan=lifespan,
 )
+app.add_middleware(
+    RequestLogMiddleware,
+    service="function",
+    log_buffer=log_buffer,
+    trust_cloudflare=ISCLOUDFLARE,
+)
 
 
 @app.get("/", summary="Health check")
-@loggers_route()
 async def read_root():
     """
     Health check endpoint for the Function service.
@@ -52,8 +74,19 @@ async def read_root():
     return {"status": "healthy", "service": "function"}
 
 
-@app.post("/create", summary="Create a new function function")
-@loggers_route()
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Exposes the service metrics in the Prometheus text format.
+    """
+    return metrics_response()
+
+
+@app.post(
+    "/create",
+    summary="Create a new function function",
+    dependencies=[Depends(require_token)],
+)
 async def create_function(data: Function):
     """
     Creates a new function and attempts to build it.
@@ -84,15 +117,16 @@ async def create_function(data: Function):
         except Exception as build_error:
             error_id = random.randint(100000, 9999999999999)
             print(f"Build error: {build_error}")
-            await logs.insert_one(
-                {
-                    "name": data.name,
-                    "error": str(build_error),
-                    "timestamp": utc_now(),
-                    "status": "error",
-                    "error_id": error_id,
-                    "type": "build_error",
-                }
+            await log_buffer.put(
+                log_entry(
+                    "function",
+                    "/create",
+                    name=data.name,
+                    error=str(build_error),
+                    status="error",
+                    error_id=error_id,
+                    type="build_error",
+                )
             )
             return {
                 "message": "Function saved but the build process failed. Please contact support and use the error ID below.",
@@ -101,15 +135,16 @@ async def create_function(data: Function):
     except Exception as db_error:
         error_id = random.randint(100000, 9999999999999)
         print(f"Database error: {db_error}")
-        await logs.insert_one(
-            {
-                "name": data.name,
-                "error": str(db_error),
-                "timestamp": utc_now(),
-                "status": "error",
-                "error_id": error_id,
-                "type": "db_error",
-            }
+        await log_buffer.put(
+            log_entry(
+                "function",
+                "/create",
+                name=data.name,
+                error=str(db_error),
+                status="error",
+                error_id=error_id,
+                type="db_error",
+            )
         )
         return {
             "message": "Function failed to create. Please contact support and use the error ID below.",
@@ -119,5 +154,5 @@ async def create_function(data: Function):
 
 if __name__ == "__main__":
     print("Starting Envybase Function Service...")
-    uvicorn.run(app, host=host, port=int(FUNC_PORT))
+    serve("main:app", host, FUNC_PORT)
     print("Stopping Envybase Function Service...")
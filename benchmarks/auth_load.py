@@ -0,0 +1,364 @@
+"""
+Load test of the auth service endpoints, saving results as JSON for comparison.
+
+Runs each scenario with a fixed number of requests at a given concurrency and
+reports successful requests per second and their p50/p95/p99 latency:
+
+    register   POST /register with a new user per request
+    login      POST /login, cycling through users registered beforehand
+    oauth      GET /oauth2/login/github then /oauth2/callback/github, against the
+               stub GitHub API from stubs/github_api.py
+    logs       GET /stats/logs, a page of request logs
+    stats      GET /stats, the log aggregation (needs MongoDB 7.0+, not mongomock)
+
+By default the service runs in-process on an in-memory MongoDB (stubs/mongo.py)
+and fakeredis, so no server is needed. ``--mongo`` and ``--redis`` point it at real
+servers instead, and ``--url`` runs the requests against a deployed service (the
+oauth scenario only runs in-process, as it needs the service to talk to the stub).
+In-process, the login throttle is lifted and the hashing pool queues a job per
+worker; against ``--url``, requests throttled (429) or shed (503) by the service
+are counted as errors.
+
+With ``--baseline`` the results are compared to an earlier run, and the script
+exits with status 1 if a scenario's throughput dropped or p95 latency rose by more
+than ``--tolerance``.
+
+Usage:
+    python benchmarks/auth_load.py [--requests 500] [--concurrency 32] [--output auth.json]
+    python benchmarks/auth_load.py --scenarios login,logs --baseline auth.json
+    python benchmarks/auth_load.py --url http://localhost:3121 --scenarios register,login
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import secrets
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stubs.github_api import create_app as create_github_app
+
+PASSWORD = "correct horse battery"
+SCENARIOS = ("register", "login", "oauth", "logs", "stats")
+
+
+def configure_environment(args):
+    """
+    Sets up the environment of the in-process service, before it is imported.
+    """
+    # The auth config refuses to load without these
+    for name, value in {
+        "MONGO_URI": args.mongo or "mongodb://localhost:27017",
+        "REDIS_HOST": "localhost",
+        "ISSUER": "benchmark",
+        "AUTH_KEY": secrets.token_hex(32),
+        "SOCIAL_LOGINS": "github",
+        "GITHUB_CLIENT_ID": "stub-client",
+        "GITHUB_CLIENT_SECRET": "stub-secret",
+        # Measured, but never the limiting factor
+        "LOGIN_RATE_LIMIT_IP": "1000000000",
+        "LOGIN_RATE_LIMIT_EMAIL": "1000000000",
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        # Queue every worker's hash job rather than shedding them with 503s
+        "HASH_QUEUE_SIZE": str(args.concurrency),
+    }.items():
+        os.environ.setdefault(name, value)
+    auth_dir = os.path.join(os.path.dirname(__file__), "..", "apps", "auth")
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps"))
+    sys.path.insert(0, auth_dir)
+    # The service resolves relative paths (e.g. JWT_KEYS_DIR) from its directory
+    os.chdir(auth_dir)
+    if not args.mongo:
+        from stubs import mongo
+
+        mongo.install()
+
+
+def start_github_stub(port: int, latency_ms: float) -> str:
+    server = uvicorn.Server(
+        uvicorn.Config(create_github_app(latency_ms), port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+@contextlib.asynccontextmanager
+async def in_process_service(args):
+    """
+    Runs the auth app in this process and yields a transport to it.
+    """
+    import fakeredis
+    from redis.asyncio import Redis
+
+    import main
+    import oauth2
+    import ratelimit
+
+    # Per-request log lines would dominate the output and the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    redis = Redis.from_url(args.redis) if args.redis else fakeredis.FakeAsyncRedis()
+    ratelimit.redis_client = ratelimit.login_limiter.redis = redis
+
+    github = start_github_stub(args.github_port, args.github_latency_ms)
+    oauth2.providers["github"].update(
+        userinfo_endpoint=f"{github}/user", email_endpoint=f"{github}/user/emails"
+    )
+    oauth2.oauth.github.access_token_url = f"{github}/login/oauth/access_token"
+
+    async with main.lifespan(main.app):
+        yield httpx.ASGITransport(app=main.app)
+
+
+def summarize(latencies: list, statuses: Counter, seconds: float) -> dict:
+    ok = [ms for ms, status in latencies if status < 400]
+    errors = len(latencies) - len(ok)
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+        "seconds": round(seconds, 3),
+        "rps": round(len(ok) / seconds, 1) if seconds else 0,
+    }
+    if len(ok) >= 2:
+        cuts = statistics.quantiles(ok, n=100, method="inclusive")
+        result.update(
+            p50_ms=round(cuts[49], 2),
+            p95_ms=round(cuts[94], 2),
+            p99_ms=round(cuts[98], 2),
+            max_ms=round(max(ok), 2),
+        )
+    return result
+
+
+async def run_scenario(clients: list, request, total: int) -> dict:
+    """
+    Sends ``total`` requests, ``request(client, i)`` each, from one worker per client.
+    """
+    numbers = itertools.count()
+    latencies = []
+    statuses = Counter()
+
+    async def worker(client):
+        while (i := next(numbers)) < total:
+            started = time.perf_counter()
+            try:
+                status = (await request(client, i)).status_code
+            except httpx.HTTPError:
+                status = 599  # Transport failure, counted as an error
+            latencies.append(((time.perf_counter() - started) * 1000, status))
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+def build_scenarios(run_id: str, login_users: int) -> dict:
+    def user(prefix: str, i: int) -> dict:
+        return {
+            "email": f"{prefix}-{run_id}-{i}@example.com",
+            "password": PASSWORD,
+            "name": "Bench User",
+            "username": f"{prefix}{run_id}{i}",
+        }
+
+    async def register(client, i):
+        return await client.post("/register", json=user("reg", i))
+
+    async def login(client, i):
+        data = user("login", i % login_users)
+        return await client.post(
+            "/login", json={"email": data["email"], "password": PASSWORD}
+        )
+
+    async def oauth(client, i):
+        response = await client.get("/oauth2/login/github")
+        if response.status_code != 302:
+            return response
+        state = parse_qs(urlparse(response.headers["location"]).query)["state"][0]
+        return await client.get(
+            "/oauth2/callback/github", params={"code": "stub-code", "state": state}
+        )
+
+    async def logs(client, i):
+        return await client.get("/stats/logs", params={"limit": 50})
+
+    async def stats(client, i):
+        return await client.get("/stats")
+
+    async def setup_login(client):
+        for i in range(login_users):
+            response = await client.post("/register", json=user("login", i))
+            if response.status_code != 200:
+                raise RuntimeError(f"Could not register login users: {response.text}")
+
+    return {
+        "register": (register, None),
+        "login": (login, setup_login),
+        "oauth": (oauth, None),
+        "logs": (logs, None),
+        "stats": (stats, None),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns the regressions of ``results`` against ``baseline``, as messages.
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before.get("rps") and current["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {before['rps']} -> {current['rps']} rps")
+        if before.get("p95_ms") and current.get("p95_ms", 0) > before["p95_ms"] * (
+            1 + tolerance
+        ):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--scenarios", default="register,login,oauth,logs", help=", ".join(SCENARIOS)
+    )
+    parser.add_argument("--url", help="deployed auth service, instead of in-process")
+    parser.add_argument("--mongo", help="MongoDB URI, in-memory stand-in if omitted")
+    parser.add_argument("--redis", help="Redis URL, fakeredis if omitted")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--login-users", type=int, default=50)
+    parser.add_argument("--github-port", type=int, default=9011)
+    parser.add_argument("--github-latency-ms", type=float, default=20)
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--baseline", help="results of an earlier run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.url and "oauth" in names:
+        parser.error("the oauth scenario only runs in-process, without --url")
+    if "stats" in names and not (args.url or args.mongo):
+        parser.error("the stats scenario needs a real MongoDB, pass --mongo or --url")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+
+    results = asyncio.run(run_benchmark(args, names))
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results saved to {output}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+async def run_benchmark(args, names: list) -> dict:
+    """Runs the scenarios in ``names`` one after the other and returns the results."""
+    if args.url:
+        service = contextlib.nullcontext(httpx.AsyncHTTPTransport())
+        base_url = args.url
+    else:
+        configure_environment(args)
+        service = in_process_service(args)
+        base_url = "http://auth"
+
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "target": args.url or "in-process",
+            "mongo": "external" if args.mongo else "in-memory",
+            "redis": "external" if args.redis else "fakeredis",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "bcrypt_rounds": None if args.url else args.bcrypt_rounds,
+            "python": platform.python_version(),
+            "cores": os.cpu_count(),
+        },
+        "scenarios": {},
+    }
+    scenarios = build_scenarios(secrets.token_hex(3), args.login_users)
+    print(
+        f"{args.requests} requests per scenario, concurrency {args.concurrency}, "
+        f"{results['meta']['target']}"
+    )
+    print(
+        f"{'scenario':<10}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    )
+    async with service as transport:
+        # One client per worker, so each keeps its own session cookie
+        clients = [
+            httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60)
+            for _ in range(args.concurrency)
+        ]
+        try:
+            for name in names:
+                request, setup = scenarios[name]
+                if setup:
+                    await setup(clients[0])
+                result = await run_scenario(clients, request, args.requests)
+                results["scenarios"][name] = result
+                print(
+                    f"{name:<10}{result['rps']:>9.1f}"
+                    + "".join(
+                        f"{result.get(key, float('nan')):>9.1f}"
+                        for key in ("p50_ms", "p95_ms", "p99_ms")
+                    )
+                    + f"{result['errors']:>8}"
+                )
+        finally:
+            for client in clients:
+                await client.aclose()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of the GitHub user info lookup in the OAuth2 callback.
+
+Runs the stub GitHub API from stubs/github_api.py on localhost, with a simulated
+round trip latency, and looks up users for a user hiding their email the way the
+callback used to (a new client per login, profile then email list) and through
+``fetch_user_info`` (pooled client, email list still fetched after the profile).
+Reports the latency per login and the number of TCP connections the stub saw.
+
+Usage:
+    python benchmarks/oauth_userinfo.py [--logins 50] [--latency-ms 80]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+# The auth config refuses to load without these, their values do not matter here
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "REDIS_HOST": "localhost",
+    "ISSUER": "benchmark",
+    "AUTH_KEY": "benchmark",
+}.items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "auth"))
+
+import oauth2  # noqa: E402
+from httpclient import close_http_pool  # noqa: E402
+from stubs.github_api import create_app  # noqa: E402
+
+TOKEN = {"access_token": "stub-token"}
+
+
+def start_stub(port: int, latency_ms: float) -> str:
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(latency_ms), port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def legacy_fetch(base: str) -> dict:
+    """The callback's old GitHub lookup."""
+    async with httpx.AsyncClient() as c:
+        headers = {"Authorization": f"Bearer {TOKEN['access_token']}"}
+        data = (await c.get(f"{base}/user", headers=headers)).json()
+        if not data.get("email"):
+            emails = (await c.get(f"{base}/user/emails", headers=headers)).json()
+            data["email"] = next(
+                (e["email"] for e in emails if e.get("primary") and e.get("verified")),
+                None,
+            )
+    return data
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--port", type=int, default=9010)
+    args = parser.parse_args()
+
+    base = start_stub(args.port, args.latency_ms)
+    oauth2.providers["github"] = {
+        "userinfo_endpoint": f"{base}/user",
+        "email_endpoint": f"{base}/user/emails",
+    }
+
+    async def legacy():
+        return await legacy_fetch(base)
+
+    async def pooled():
+        return await oauth2.fetch_user_info(None, TOKEN, "github", 0)
+
+    print(f"{args.logins} GitHub logins, {args.latency_ms:g} ms simulated latency")
+    print(f"{'variant':<10}{'ms/login':>10}{'connections':>14}")
+    async with httpx.AsyncClient(base_url=base) as stub:
+        for name, fetch in (("legacy", legacy), ("pooled", pooled)):
+            before = (await stub.get("/stats")).json()
+            started = time.perf_counter()
+            for _ in range(args.logins):
+                assert (await fetch())["email"] == "stub@example.com"
+            elapsed = (time.perf_counter() - started) / args.logins * 1000
+            after = (await stub.get("/stats")).json()
+            connections = after["connections"] - before["connections"]
+            print(f"{name:<10}{elapsed:>10.1f}{connections:>14}")
+    await close_http_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
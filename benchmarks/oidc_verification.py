@@ -0,0 +1,143 @@
+"""
+Benchmark of Google-style id_token verification in the OAuth2 callback.
+
+Runs the stub OpenID provider from stubs/oidc_server.py on localhost and verifies
+id_tokens the way the callback used to (a new ``PyJWKClient`` per login, fetching
+the JWKS synchronously) and through the cached ``OIDCProvider``. Reports the time
+per verification, the worst event loop stall and how often the provider was hit,
+then rotates the provider's key to check that the cache picks the new key up with
+a single refetch.
+
+Usage:
+    python benchmarks/oidc_verification.py [--logins 200] [--port 9009]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+import jwt
+import uvicorn
+
+# The auth config refuses to load without these, their values do not matter here
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "REDIS_HOST": "localhost",
+    "ISSUER": "benchmark",
+    "AUTH_KEY": "benchmark",
+}.items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "auth"))
+
+from oidc import OIDCProvider  # noqa: E402
+from stubs.oidc_server import create_app  # noqa: E402
+
+CLIENT_ID = "stub-client"
+
+
+def start_stub(port: int) -> str:
+    issuer = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(issuer), port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return issuer
+
+
+def legacy_verify(jwks_uri: str, id_token: str) -> dict:
+    """The callback's old verification, minus authlib's cached metadata."""
+    signing_key = jwt.PyJWKClient(jwks_uri).get_signing_key_from_jwt(id_token)
+    return jwt.decode(
+        id_token, signing_key.key, algorithms=["RS256"], audience=CLIENT_ID
+    )
+
+
+async def watch_loop(stop: asyncio.Event, interval=0.005) -> float:
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - scheduled)
+    return worst
+
+
+async def measure(verify, logins: int):
+    stop = asyncio.Event()
+    await verify()  # Warm up, the cached variant fetches its documents here
+    watcher = asyncio.create_task(watch_loop(stop))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    for _ in range(logins):
+        await verify()
+        await asyncio.sleep(0)  # Let other tasks run between logins, as a server would
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed / logins * 1e6, await watcher
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--port", type=int, default=9009)
+    args = parser.parse_args()
+
+    issuer = start_stub(args.port)
+    async with httpx.AsyncClient(base_url=issuer) as stub:
+
+        async def mint():
+            return (await stub.get("/mint", params={"aud": CLIENT_ID})).json()[
+                "id_token"
+            ]
+
+        async def fetches():
+            return (await stub.get("/stats")).json()
+
+        id_token = await mint()
+        provider = OIDCProvider(
+            f"{issuer}/.well-known/openid-configuration",
+            CLIENT_ID,
+            min_refresh_interval=1,
+        )
+
+        async def legacy():
+            legacy_verify(f"{issuer}/jwks", id_token)
+
+        async def cached():
+            await provider.verify_id_token(id_token)
+
+        print(f"{args.logins} id_token verifications against {issuer}")
+        print(
+            f"{'variant':<10}{'us/login':>10}{'max loop stall ms':>20}{'fetches':>10}"
+        )
+        for name, verify in (("legacy", legacy), ("cached", cached)):
+            before = await fetches()
+            per_login, stall = await measure(verify, args.logins)
+            after = await fetches()
+            count = sum(after.values()) - sum(before.values())
+            print(f"{name:<10}{per_login:>10.0f}{stall * 1000:>20.1f}{count:>10}")
+
+        # A key rotation is picked up with one JWKS refetch, shared by all callers
+        await asyncio.sleep(1)
+        await stub.post("/rotate")
+        before = await fetches()
+        rotated = await mint()
+        await asyncio.gather(*(provider.verify_id_token(rotated) for _ in range(20)))
+        after = await fetches()
+        print(
+            f"after key rotation: 20 concurrent logins, "
+            f"{after['jwks'] - before['jwks']} JWKS fetch(es)"
+        )
+        await provider.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
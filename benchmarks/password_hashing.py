@@ -0,0 +1,104 @@
+"""
+Load test of concurrent login password checks through the auth hashing pool.
+
+Fires concurrent bcrypt verifications, the CPU-bound part of /login, through
+``HashingPool`` with an increasing number of workers and reports logins per second
+and the worst event loop stall seen meanwhile. Throughput should grow with the
+worker count up to the number of cores, while the loop stays responsive. The
+``inline`` row runs bcrypt on the event loop, as /login did before, for comparison.
+
+Usage:
+    python benchmarks/password_hashing.py [--logins 64] [--kind thread|process]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import bcrypt
+
+# The auth config refuses to load without these, their values do not matter here
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "REDIS_HOST": "localhost",
+    "ISSUER": "benchmark",
+    "AUTH_KEY": "benchmark",
+}.items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "auth"))
+
+from hashing import HashingPool  # noqa: E402
+from utils import verify_password  # noqa: E402
+
+PASSWORD = "correct horse battery"
+
+
+async def watch_loop(stop: asyncio.Event, interval=0.01) -> float:
+    """Returns the longest delay of a periodic wakeup until ``stop`` is set."""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - scheduled)
+    return worst
+
+
+async def run(check, logins: int, concurrency: int):
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    slots = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with slots:
+            assert await check()
+
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return logins / elapsed, await watcher
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--kind", choices=["thread", "process"], default="thread")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost")
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(args.rounds)).decode()
+    print(
+        f"{args.logins} logins, concurrency {args.concurrency}, "
+        f"bcrypt cost {args.rounds}, {os.cpu_count()} cores, {args.kind} pool"
+    )
+    print(f"{'workers':<10}{'logins/s':>10}{'max loop stall ms':>20}")
+
+    async def inline():
+        return verify_password(PASSWORD, hashed)
+
+    rate, stall = await run(inline, args.logins, args.concurrency)
+    print(f"{'inline':<10}{rate:>10.1f}{stall * 1000:>20.1f}")
+
+    counts = {args.max_workers}
+    counts.update(2**i for i in range(args.max_workers.bit_length()))
+    for workers in sorted(n for n in counts if n <= args.max_workers):
+        pool = HashingPool(args.kind, workers, queue_size=args.concurrency)
+
+        async def pooled(pool=pool):
+            return await pool.run(verify_password, PASSWORD, hashed)
+
+        await pooled()  # Warm the pool up
+        rate, stall = await run(pooled, args.logins, args.concurrency)
+        pool.shutdown()
+        print(f"{workers:<10}{rate:>10.1f}{stall * 1000:>20.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+"""
+Microbenchmark of the per-request overhead of request logging.
+
+Compares the old per-route ``loggers_route`` decorator (signature binding, repeated
+``real_ip`` calls and eager f-strings) with the shared ``RequestLogMiddleware``.
+Both write into a no-op log buffer, so only the instrumentation itself is measured.
+Requests are driven straight through the ASGI interface to keep transport noise out.
+
+Usage:
+    python benchmarks/request_logging.py [--requests 20000] [--log-level WARNING]
+"""
+
+import argparse
+import asyncio
+import inspect
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from functools import wraps
+
+import pytz
+from fastapi import FastAPI, Request, Response
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps"))
+
+from common.middleware import RequestLogMiddleware
+
+logger = logging.getLogger("logs")
+
+
+class NullBuffer:
+    async def put(self, doc):
+        return True
+
+
+null_buffer = NullBuffer()
+
+
+def real_ip(request: Request) -> str:
+    return request.headers.get("X-Real-IP", request.client.host)
+
+
+def legacy_loggers_route():
+    """
+    The decorator the services used before the middleware, minus the Mongo write.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            sig = inspect.signature(func)
+            bound_args = sig.bind(*args, **kwargs)
+            bound_args.apply_defaults()
+            request = bound_args.arguments.get("request")
+            utc_now = datetime.now(pytz.UTC)
+            base_doc = {
+                "method": request.method,
+                "path": request.url.path,
+                "client": real_ip(request),
+                "timestamp": utc_now,
+                "service": "bench",
+            }
+            logger.info(
+                f"[{utc_now}]"
+                f"Request: Method={request.method} "
+                f"Path={request.url.path} "
+                f"Client={real_ip(request)} "
+            )
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+                logger.info(
+                    f"[{utc_now}]"
+                    f"Response: Method={request.method} "
+                    f"Path={request.url.path} "
+                    f"Status=200 "
+                    f"Client={real_ip(request)} "
+                )
+                base_doc["status_code"] = 200
+                base_doc["duration_ms"] = (time.perf_counter() - started) * 1000
+                await null_buffer.put(base_doc)
+                return result
+            except Exception as e:
+                match = re.search(r"ERROR:(\d+)", str(e))
+                base_doc["error"] = str(e)
+                base_doc["status_code"] = int(match.group(1)) if match else 500
+                await null_buffer.put(base_doc)
+                raise
+
+        return wrapper
+
+    return decorator
+
+
+def build_apps():
+    plain = FastAPI()
+    legacy = FastAPI()
+    middleware = FastAPI()
+    middleware.add_middleware(
+        RequestLogMiddleware, service="bench", log_buffer=null_buffer
+    )
+
+    async def handler(request: Request, response: Response, item_id: int):
+        return {"status": "ok", "item": item_id}
+
+    plain.get("/items/{item_id}")(handler)
+    legacy.get("/items/{item_id}")(legacy_loggers_route()(handler))
+    middleware.get("/items/{item_id}")(handler)
+    return {"none": plain, "decorator": legacy, "middleware": middleware}
+
+
+async def call(app):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/items/42",
+        "raw_path": b"/items/42",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"x-real-ip", b"203.0.113.7")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app, requests: int) -> float:
+    for _ in range(min(1000, requests)):
+        await call(app)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+
+    apps = build_apps()
+    results = {name: [] for name in apps}
+    for _ in range(args.rounds):
+        for name, app in apps.items():
+            results[name].append(await measure(app, args.requests))
+
+    baseline = min(results["none"])
+    print(
+        f"{args.requests} requests x {args.rounds} rounds, log level {args.log_level}"
+    )
+    print(f"{'variant':<12}{'us/request':>12}{'overhead us':>14}")
+    for name, timings in results.items():
+        best = min(timings)
+        print(f"{name:<12}{best:>12.1f}{best - baseline:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
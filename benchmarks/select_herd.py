@@ -0,0 +1,202 @@
+"""
+Thundering herd on the database service: bursts of identical /select requests, with
+and without single-flight coalescing of the reads.
+
+Each wave sends ``--herd`` identical requests for the same page at once, as when a
+popular page is first loaded or its cached copy expires, and waits for all of them.
+Both modes run the same waves, one after the other, and report successful requests
+per second, p50/p95/p99 latency and the number of MongoDB queries made, which
+coalescing should bring down to about one per wave.
+
+By default the service runs in-process on an in-memory MongoDB (stubs/mongo.py),
+where a query costs Python time only; ``--mongo`` points it at a real server, where
+the herd also competes for the connection pool (MONGO_POOL_SIZE).
+
+Usage:
+    python benchmarks/select_herd.py [--herd 500] [--waves 10] [--page-size 100]
+    python benchmarks/select_herd.py --mongo mongodb://localhost:27017 --output herd.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+COLLECTION = "herd"
+
+
+def configure_environment(args):
+    """
+    Sets up the environment of the in-process service, before it is imported.
+    """
+    os.environ.setdefault("MONGO_URI", args.mongo or "mongodb://localhost:27017")
+    # The page is read from MongoDB on every request, never from the result cache
+    os.environ.pop("REDIS_HOST", None)
+    database_dir = os.path.join(os.path.dirname(__file__), "..", "apps", "database")
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps"))
+    sys.path.insert(0, database_dir)
+    os.chdir(database_dir)
+    if not args.mongo:
+        from stubs import mongo
+
+        mongo.install()
+
+
+def queries_made(requests: int, coalesced: bool) -> int:
+    """MongoDB queries made by /select so far, as counted by the single-flight group."""
+    from prometheus_client import REGISTRY
+
+    if not coalesced:
+        return requests
+    return int(
+        sum(
+            REGISTRY.get_sample_value(
+                "envybase_single_flight_calls_total",
+                {"group": "select", "role": role},
+            )
+            or 0
+            for role in ("leader", "bypass")
+        )
+    )
+
+
+async def run_mode(client, args, coalesced: bool) -> dict:
+    import main
+
+    main.SELECT_COALESCE = coalesced
+    body = {"query": {"json.group": 1}, "sort": {"json.n": 1}, "limit": args.page_size}
+    queries_before = queries_made(0, coalesced)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        started = time.perf_counter()
+        response = await client.post(
+            "/select", params={"collection": COLLECTION}, json=body
+        )
+        if response.status_code == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+        else:
+            errors += 1
+
+    started = time.perf_counter()
+    for _ in range(args.waves):
+        await asyncio.gather(*(one() for _ in range(args.herd)))
+    seconds = time.perf_counter() - started
+    requests = args.waves * args.herd
+    result = {
+        "requests": requests,
+        "errors": errors,
+        "mongo_queries": queries_made(requests, coalesced) - queries_before,
+        "seconds": round(seconds, 3),
+        "rps": round(len(latencies) / seconds, 1),
+    }
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        result.update(
+            p50_ms=round(cuts[49], 2),
+            p95_ms=round(cuts[94], 2),
+            p99_ms=round(cuts[98], 2),
+            max_ms=round(max(latencies), 2),
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--herd", type=int, default=500, help="requests per wave")
+    parser.add_argument("--waves", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--mongo", help="MongoDB URI, in-memory stand-in if omitted")
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    configure_environment(args)
+    results = asyncio.run(run_benchmark(args))
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results saved to {output}")
+
+
+async def run_benchmark(args) -> dict:
+    """Runs both modes one after the other and returns the results."""
+    import main as service
+
+    # Per-request log lines would dominate the output and the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mongo": "external" if args.mongo else "in-memory",
+            "herd": args.herd,
+            "waves": args.waves,
+            "page_size": args.page_size,
+            "documents": args.documents,
+            "python": platform.python_version(),
+            "cores": os.cpu_count(),
+        },
+        "modes": {},
+    }
+    print(
+        f"{args.waves} waves of {args.herd} identical /select requests, "
+        f"{args.page_size} of {args.documents} documents per page"
+    )
+    print(
+        f"{'mode':<12}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'queries':>9}{'errors':>8}"
+    )
+    async with service.lifespan(service.app):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://database", timeout=120
+        ) as client:
+            response = await client.post(
+                "/insert_many",
+                params={"collection": COLLECTION},
+                json={
+                    "documents": [
+                        {"json": {"group": i % 2, "n": i, "payload": "x" * 100}}
+                        for i in range(args.documents)
+                    ]
+                },
+            )
+            response.raise_for_status()
+            try:
+                for name, coalesced in (("separate", False), ("coalesced", True)):
+                    result = await run_mode(client, args, coalesced)
+                    results["modes"][name] = result
+                    print(
+                        f"{name:<12}{result['rps']:>9.1f}"
+                        + "".join(
+                            f"{result.get(key, float('nan')):>9.1f}"
+                            for key in ("p50_ms", "p95_ms", "p99_ms")
+                        )
+                        + f"{result['mongo_queries']:>9}{result['errors']:>8}"
+                    )
+            finally:
+                # Leaves a real database as it was found
+                await client.post(
+                    "/bulk",
+                    params={"collection": COLLECTION},
+                    json={"operations": [{"delete": {"query": {}}, "many": True}]},
+                )
+    return results
+
+
+if __name__ == "__main__":
+    main()
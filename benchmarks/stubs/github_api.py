@@ -0,0 +1,76 @@
+"""
+Stub of the GitHub REST endpoints the OAuth2 callback calls, with an artificial
+per-request latency standing in for the round trip to api.github.com.
+
+The profile hides its email, like GitHub does for users with a private email, so
+the callback has to consult the email list as well.
+
+Usage:
+    python benchmarks/stubs/github_api.py [--port 9010] [--latency-ms 80]
+
+    POST /login/oauth/access_token   access token for any authorization code
+    GET  /user                       profile without email
+    GET  /user/emails                email list with a verified primary address
+    GET  /stats                      request and connection counters
+"""
+
+import argparse
+import asyncio
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+def create_app(latency_ms: float = 80) -> FastAPI:
+    app = FastAPI(title="Stub GitHub API")
+    state = {"requests": 0, "connections": set()}
+
+    async def simulate(request: Request):
+        state["requests"] += 1
+        state["connections"].add(request.scope.get("client"))
+        await asyncio.sleep(latency_ms / 1000)
+
+    @app.post("/login/oauth/access_token")
+    async def access_token(request: Request):
+        await simulate(request)
+        return {
+            "access_token": "stub-token",
+            "token_type": "bearer",
+            "scope": "user:email",
+        }
+
+    @app.get("/user")
+    async def user(request: Request):
+        await simulate(request)
+        return {
+            "login": "stub-user",
+            "name": "Stub User",
+            "email": None,
+            "avatar_url": "https://example.com/avatar.png",
+        }
+
+    @app.get("/user/emails")
+    async def emails(request: Request):
+        await simulate(request)
+        return [
+            {"email": "other@example.com", "primary": False, "verified": True},
+            {"email": "stub@example.com", "primary": True, "verified": True},
+        ]
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "requests": state["requests"],
+            "connections": len(state["connections"]),
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub GitHub API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), host=args.host, port=args.port)
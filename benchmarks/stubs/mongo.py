@@ -0,0 +1,43 @@
+"""
+In-memory stand-in for MongoDB, for running a service without a database server.
+
+``install()`` replaces Motor's client with mongomock-motor (``pip install
+mongomock-motor``) before the service is imported, and answers the commands the
+services send at startup that mongomock does not implement. The logs collection
+becomes a regular collection instead of a time-series one. Aggregations using
+operators mongomock lacks, such as ``$percentile`` in GET /stats, still fail, so
+measure those against a real server.
+"""
+
+from pymongo.errors import OperationFailure
+
+
+def install():
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockDatabase
+
+    class Admin:
+        async def command(self, *args, **kwargs):
+            return {"ok": 1}
+
+    class Client(AsyncMongoMockClient):
+        # Drops the pool and timeout options of the services' clients
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+            self.admin = Admin()
+
+    create_collection = AsyncMongoMockDatabase.create_collection
+
+    async def create_plain_collection(self, name, **options):
+        if options:
+            raise OperationFailure("Collection options are not supported", code=72)
+        return await create_collection(self, name)
+
+    async def command(self, name, *args, **kwargs):
+        if name == "listCollections":
+            return {"cursor": {"firstBatch": []}}
+        return {"ok": 1}
+
+    AsyncMongoMockDatabase.create_collection = create_plain_collection
+    AsyncMongoMockDatabase.command = command
+    motor.motor_asyncio.AsyncIOMotorClient = Client
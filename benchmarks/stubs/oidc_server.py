@@ -0,0 +1,105 @@
+"""
+Stub OpenID Connect provider for exercising the auth service's id_token handling
+without a real identity provider.
+
+Serves a discovery document and a JWKS, mints id_tokens signed with its current key
+and counts how often each document is fetched. ``/rotate`` switches to a fresh
+signing key, dropping the old one from the JWKS.
+
+Usage:
+    python benchmarks/stubs/oidc_server.py [--port 9000]
+
+    GET  /.well-known/openid-configuration
+    GET  /jwks
+    GET  /mint?sub=...&aud=...&email=...   a signed id_token
+    POST /rotate                           new signing key
+    GET  /stats                            fetch counters
+"""
+
+import argparse
+import itertools
+import json
+import time
+
+import jwt
+import uvicorn
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from jwt.algorithms import RSAAlgorithm
+
+
+def create_app(issuer: str = "http://127.0.0.1:9000") -> FastAPI:
+    """
+    Builds the stub provider, ``issuer`` being the URL it is reachable at.
+    """
+    app = FastAPI(title="Stub OIDC provider")
+    kids = itertools.count(1)
+    state = {"kid": None, "key": None, "fetches": {"metadata": 0, "jwks": 0}}
+
+    def rotate():
+        state["kid"] = f"stub-{next(kids)}"
+        state["key"] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    rotate()
+
+    @app.get("/.well-known/openid-configuration")
+    async def metadata():
+        state["fetches"]["metadata"] += 1
+        return {
+            "issuer": issuer,
+            "jwks_uri": f"{issuer}/jwks",
+            "authorization_endpoint": f"{issuer}/authorize",
+            "token_endpoint": f"{issuer}/token",
+            "id_token_signing_alg_values_supported": ["RS256"],
+        }
+
+    @app.get("/jwks")
+    async def jwks():
+        state["fetches"]["jwks"] += 1
+        jwk = json.loads(RSAAlgorithm.to_jwk(state["key"].public_key()))
+        jwk.update({"kid": state["kid"], "use": "sig", "alg": "RS256"})
+        return {"keys": [jwk]}
+
+    @app.get("/mint")
+    async def mint(
+        sub: str = "stub-user",
+        aud: str = "stub-client",
+        email: str = "user@example.com",
+        ttl: int = 3600,
+    ):
+        now = int(time.time())
+        claims = {
+            "iss": issuer,
+            "sub": sub,
+            "aud": aud,
+            "email": email,
+            "email_verified": True,
+            "name": "Stub User",
+            "iat": now,
+            "exp": now + ttl,
+        }
+        token = jwt.encode(
+            claims, state["key"], algorithm="RS256", headers={"kid": state["kid"]}
+        )
+        return {"id_token": token}
+
+    @app.post("/rotate")
+    async def rotate_key():
+        rotate()
+        return {"kid": state["kid"]}
+
+    @app.get("/stats")
+    async def stats():
+        return state["fetches"]
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenID Connect provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(f"http://{args.host}:{args.port}"), host=args.host, port=args.port
+    )